@@ -1,9 +1,20 @@
 import logging
 import os
+import sys
+import signal
 import asyncio
-from flask import Flask
+
+# uvloop (libuv) acelera el event loop en Linux/Render.
+# No está disponible en Windows, por eso el import es opcional.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import Application, AIORateLimiter, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.request import HTTPXRequest
+from telegram.error import NetworkError, RetryAfter, TimedOut
 
 # Importar configuración
 from config import TELEGRAM_TOKEN
@@ -27,10 +38,41 @@ from handlers.messages import (
     handle_document,
     handle_sticker
 )
+from utils.tools import currency_converter
 
 # Detectar si estamos en producción (Render) o desarrollo
 IS_PRODUCTION = os.getenv('RENDER') is not None
 
+# Tablas de dispatch: un solo lugar para registrar (y filtrar) handlers
+COMMANDS = (
+    ("start", start_command),
+    ("help", help_command),
+    ("fecha", fecha_command),
+    ("clima", clima_command),
+    ("chiste", chiste_command),
+    ("reset", reset_command),
+    ("convertir", convertir_command),
+    ("traducir", traducir_command),
+    ("letra", letra_command),
+)
+
+# El bot solo maneja mensajes (texto, comandos, voz, foto, documento, sticker);
+# pedir únicamente "message" evita que Telegram envíe y PTB parsee el resto
+ALLOWED_UPDATES = ["message"]
+
+# Filtros compuestos construidos una sola vez y reutilizados por identidad
+TEXT_NO_CMD = filters.TEXT & ~filters.COMMAND
+DOCS = filters.Document.ALL
+STICKERS = filters.Sticker.ALL
+
+MESSAGE_HANDLERS = (
+    (TEXT_NO_CMD, handle_message),
+    (filters.VOICE, handle_voice),
+    (filters.PHOTO, handle_photo),
+    (DOCS, handle_document),
+    (STICKERS, handle_sticker),
+)
+
 # Configurar logging mejorado
 if IS_PRODUCTION:
     # En producción: solo consola (Render captura estos logs)
@@ -40,13 +82,27 @@ if IS_PRODUCTION:
         handlers=[logging.StreamHandler()]
     )
 else:
-    # En desarrollo: consola + archivo
+    # En desarrollo: consola + archivo. El FileHandler vive detrás de un
+    # QueueListener para que la escritura a disco no bloquee el event loop
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+
+    LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+    _log_queue = queue.SimpleQueue()
+    _file_handler = logging.FileHandler('bot.log', encoding='utf-8')
+    _file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _log_listener = QueueListener(_log_queue, _file_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
     logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        format=LOG_FORMAT,
         level=logging.INFO,
         handlers=[
             logging.StreamHandler(),
-            logging.FileHandler('bot.log', encoding='utf-8')
+            QueueHandler(_log_queue)
         ]
     )
 
@@ -54,17 +110,64 @@ logger = logging.getLogger(__name__)
 
 
 # ============================================
-# SERVIDOR FLASK PARA RENDER
+# BANNERS DE INICIO (solo desarrollo)
 # ============================================
-app = Flask(__name__)
+# Un solo string por banner = un solo write a stdout en lugar de ~40 prints
+
+STARTUP_BANNER = """
+============================================================
+🚀 INICIANDO BOT DE TELEGRAM CON LANGCHAIN AGENT
+   Entorno: {env}
+============================================================
+
+📋 Cargando módulos...
+   ✅ Configuración cargada
+   ✅ Gemini AI inicializado
+   ✅ Weather API conectada
+   ✅ Sistema de memoria conversacional activo
+
+🔧 Cargando LangChain Tools...
+      • 💱 CurrencyConverter
+      • 🌐 TextTranslator
+      • 🎵 LyricsFinder
+
+🤖 Inicializando LangChain Agent...
+      • AgentType: CONVERSATIONAL_REACT_DESCRIPTION
+      • Memory: ConversationBufferMemory
+      • Tools: 3 herramientas especializadas
+      ✅ Agente listo para decisiones automáticas
+"""
+
+READY_BANNER = """
+============================================================
+✅ BOT INICIADO CORRECTAMENTE
+============================================================
 
-@app.route('/')
-def home():
-    return "🤖 Bot de Telegram con LangChain está corriendo en Render."
+🤖 Funcionalidades activas:
+   • Conversaciones con contexto e historial
+   • 🆕 Agente LangChain inteligente
+   • Decisión automática de herramientas
+   • Respuestas no repetitivas
+   • Sistema de memoria por usuario
 
-@app.route('/health')
-def health():
-    return "OK", 200
+📋 Comandos disponibles:
+   /start       - Mensaje de bienvenida
+   /help        - Ver ayuda completa
+   /fecha       - Fecha y hora actual
+   /clima       - Consultar clima
+   /chiste      - Generar chiste con IA
+   /reset       - Reiniciar conversación
+
+🆕 Comandos con LangChain Tools:
+   /convertir   - 💱 Convertir monedas
+   /traducir    - 🌐 Traducir textos
+   /letra       - 🎵 Buscar letras de canciones
+
+👋 Abre Telegram y prueba tu bot
+💡 Prueba tanto comandos como preguntas naturales
+ℹ️  Presiona Ctrl+C para detener
+
+"""
 
 
 # ============================================
@@ -75,16 +178,33 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Maneja errores de forma elegante
     """
-    logger.error(f"Error: {context.error}", exc_info=context.error)
-    
+    logger.error("Error: %s", context.error, exc_info=context.error)
+
     if update and update.effective_message:
+        # Si el propio reply falla (rate limit, red caída), no insistir:
+        # reintentar aquí solo alimenta la tormenta de errores
         try:
-            await update.effective_message.reply_text(
-                "⚠️ Ocurrió un error inesperado.\n"
-                "El error ha sido registrado. Por favor intenta de nuevo."
+            await asyncio.wait_for(
+                update.effective_message.reply_text(
+                    "⚠️ Ocurrió un error inesperado.\n"
+                    "El error ha sido registrado. Por favor intenta de nuevo."
+                ),
+                timeout=2.0
             )
+        except (RetryAfter, TimedOut, NetworkError, asyncio.TimeoutError) as e:
+            logger.warning("Respuesta de error suprimida: %s", e)
         except Exception as e:
-            logger.error(f"No se pudo enviar mensaje de error: {e}")
+            logger.error("No se pudo enviar mensaje de error: %s", e)
+
+
+def register_handlers(application):
+    """
+    Registra todos los comandos, handlers de mensajes y el manejador de
+    errores sobre la aplicación (único punto de registro para todos los modos)
+    """
+    application.add_handlers([CommandHandler(name, fn) for name, fn in COMMANDS])
+    application.add_handlers([MessageHandler(f, fn) for f, fn in MESSAGE_HANDLERS])
+    application.add_error_handler(error_handler)
 
 
 # ============================================
@@ -95,149 +215,117 @@ async def run_bot():
     """
     Función asíncrona para ejecutar el bot de Telegram
     """
-    env_status = "🌐 PRODUCCIÓN (Render)" if IS_PRODUCTION else "💻 DESARROLLO (Local)"
-    
-    print("\n" + "="*60)
-    print("🚀 INICIANDO BOT DE TELEGRAM CON LANGCHAIN AGENT")
-    print(f"   Entorno: {env_status}")
-    print("="*60)
-    
-    print("\n📋 Cargando módulos...")
-    print("   ✅ Configuración cargada")
-    print("   ✅ Gemini AI inicializado")
-    print("   ✅ Weather API conectada")
-    print("   ✅ Sistema de memoria conversacional activo")
-    
-    print("\n🔧 Cargando LangChain Tools...")
-    print("      • 💱 CurrencyConverter")
-    print("      • 🌐 TextTranslator")
-    print("      • 🎵 LyricsFinder")
-    
-    print("\n🤖 Inicializando LangChain Agent...")
-    print("      • AgentType: CONVERSATIONAL_REACT_DESCRIPTION")
-    print("      • Memory: ConversationBufferMemory")
-    print("      • Tools: 3 herramientas especializadas")
-    print("      ✅ Agente listo para decisiones automáticas")
-    
-    # Crear aplicación
-    print("\n🔧 Configurando bot...")
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-    
-    # Registrar comandos básicos
-    print("📝 Registrando comandos básicos...")
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("fecha", fecha_command))
-    application.add_handler(CommandHandler("clima", clima_command))
-    application.add_handler(CommandHandler("chiste", chiste_command))
-    application.add_handler(CommandHandler("reset", reset_command))
-    
-    # Registrar comandos con Tools
-    print("🆕 Registrando comandos con LangChain Tools...")
-    application.add_handler(CommandHandler("convertir", convertir_command))
-    application.add_handler(CommandHandler("traducir", traducir_command))
-    application.add_handler(CommandHandler("letra", letra_command))
-    
-    # Registrar manejadores de mensajes
-    print("💬 Registrando handlers de mensajes...")
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_handler(MessageHandler(filters.VOICE, handle_voice))
-    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
-    application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
-    application.add_handler(MessageHandler(filters.Sticker.ALL, handle_sticker))
-    
-    # Registrar manejador de errores
-    application.add_error_handler(error_handler)
-    
+    # Tareas "eager" (Python 3.12+): los handlers que responden sin esperar I/O
+    # corren inline sin pasar por la cola del event loop
+    loop = asyncio.get_running_loop()
+    if hasattr(asyncio, 'eager_task_factory'):
+        loop.set_task_factory(asyncio.eager_task_factory)
+
+    # El banner es puramente cosmético: en producción se omite por completo
+    if not IS_PRODUCTION:
+        sys.stdout.write(STARTUP_BANNER.format(env="💻 DESARROLLO (Local)"))
+        sys.stdout.flush()
+
+    # Crear aplicación con pool HTTP amplio + HTTP/2: las respuestas
+    # concurrentes se multiplexan sobre una conexión a api.telegram.org
+    # (getUpdates usa su propio request para no competir con sendMessage)
+    # El rate limiter encola TODO el tráfico saliente bajo los límites de
+    # Telegram (~30 msg/s globales, 20 msg/min por grupo) en vez de
+    # reaccionar a los 429 cuando ya congelaron al bot entero
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .request(HTTPXRequest(connection_pool_size=128, http_version="2"))
+        .get_updates_request(HTTPXRequest(connection_pool_size=1, http_version="2"))
+        .concurrent_updates(True)
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=25,
+            overall_time_period=1,
+            group_max_rate=19,
+            group_time_period=60,
+            max_retries=1
+        ))
+        .build()
+    )
+
+    # Registrar comandos, mensajes y errores en un solo pase
+    register_handlers(application)
+
     # Mensaje de inicio
-    print("\n" + "="*60)
-    print("✅ BOT INICIADO CORRECTAMENTE")
-    print("="*60)
-    
-    print("\n🤖 Funcionalidades activas:")
-    print("   • Conversaciones con contexto e historial")
-    print("   • 🆕 Agente LangChain inteligente")
-    print("   • Decisión automática de herramientas")
-    print("   • Respuestas no repetitivas")
-    print("   • Sistema de memoria por usuario")
-    
-    print("\n📋 Comandos disponibles:")
-    print("   /start       - Mensaje de bienvenida")
-    print("   /help        - Ver ayuda completa")
-    print("   /fecha       - Fecha y hora actual")
-    print("   /clima       - Consultar clima")
-    print("   /chiste      - Generar chiste con IA")
-    print("   /reset       - Reiniciar conversación")
-    
-    print("\n🆕 Comandos con LangChain Tools:")
-    print("   /convertir   - 💱 Convertir monedas")
-    print("   /traducir    - 🌐 Traducir textos")
-    print("   /letra       - 🎵 Buscar letras de canciones")
-    
     if IS_PRODUCTION:
-        print("\n🌐 Bot desplegado en Render - Funcionando 24/7")
         logger.info("Bot ejecutándose en producción (Render)")
     else:
-        print("\n👋 Abre Telegram y prueba tu bot")
-        print("💡 Prueba tanto comandos como preguntas naturales")
-        print("ℹ️  Presiona Ctrl+C para detener\n")
-    
+        sys.stdout.write(READY_BANNER)
+        sys.stdout.flush()
+
     logger.info("Bot con LangChain Agent iniciado correctamente")
     
-    # Iniciar el bot con polling
+    # Iniciar el bot: webhook en producción (Telegram hace push, sin espera de
+    # long-poll), polling en desarrollo donde no hay URL pública
     await application.initialize()
     await application.start()
-    await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+
+    # Precalentar la lista de códigos de moneda para que /convertir
+    # valide códigos inválidos localmente desde el primer mensaje
+    warmup_task = asyncio.create_task(
+        asyncio.to_thread(currency_converter.valid_codes)
+    )
+
+    webhook_base = os.getenv('RENDER_EXTERNAL_URL')
+    if IS_PRODUCTION and webhook_base:
+        port = int(os.environ.get("PORT", 10000))
+        await application.updater.start_webhook(
+            listen="0.0.0.0",
+            port=port,
+            url_path=TELEGRAM_TOKEN,
+            webhook_url=f"{webhook_base.rstrip('/')}/{TELEGRAM_TOKEN}",
+            allowed_updates=ALLOWED_UPDATES
+        )
+        logger.info("Webhook registrado - Telegram enviará updates directamente")
+    else:
+        # timeout=50 es el máximo que permite Telegram: cada long-poll queda
+        # abierto más tiempo y el bot hace muchas menos llamadas en idle
+        await application.updater.start_polling(
+            allowed_updates=ALLOWED_UPDATES,
+            poll_interval=0,
+            timeout=50
+        )
     
-    # Mantener el bot corriendo
+    # Mantener el bot corriendo hasta recibir SIGINT/SIGTERM
+    # (Render envía SIGTERM al reciclar el contenedor)
     logger.info("Bot está corriendo y esperando mensajes...")
-    
-    # Crear un evento para mantener el bot corriendo
+
     stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows no soporta add_signal_handler; Ctrl+C sigue funcionando
+            pass
     await stop_event.wait()
 
-
-def run_bot_in_thread():
-    """
-    Ejecuta el bot en un thread con su propio event loop
-    """
-    # Crear un nuevo event loop para este thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        # Ejecutar el bot
-        loop.run_until_complete(run_bot())
-    except Exception as e:
-        logger.error(f"Error en el bot thread: {e}")
-    finally:
-        loop.close()
+    # Apagado ordenado: sin tasks zombie ni selector filtrado
+    logger.info("Señal de parada recibida, apagando el bot...")
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
 
 
 # ==============================
 # MAIN
 # ==============================
 if __name__ == '__main__':
-    import threading
-    
     try:
-        # Crear y ejecutar el thread del bot
-        bot_thread = threading.Thread(target=run_bot_in_thread, daemon=True)
-        bot_thread.start()
-        
-        # Ejecutar Flask en el thread principal
-        port = int(os.environ.get("PORT", 10000))
-        
-        if IS_PRODUCTION:
-            # En producción, usar configuración más robusta
-            app.run(host="0.0.0.0", port=port, debug=False)
-        else:
-            # En desarrollo
-            app.run(host="0.0.0.0", port=port, debug=True)
-            
+        # Un solo proceso y un solo event loop: el servidor webhook de PTB
+        # (producción) o el polling (desarrollo) corren en el mismo loop,
+        # sin Flask ni thread aparte
+        if uvloop is not None:
+            uvloop.install()
+        asyncio.run(run_bot())
+
     except KeyboardInterrupt:
         print("\n\n🛑 Bot detenido por el usuario")
         logger.info("Bot detenido manualmente")
     except Exception as e:
         print(f"\n❌ Error fatal: {e}")
-        logger.error(f"Error fatal al iniciar el bot: {e}", exc_info=True)
\ No newline at end of file
+        logger.error("Error fatal al iniciar el bot: %s", e, exc_info=True)
\ No newline at end of file
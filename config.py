@@ -1,26 +1,26 @@
 import os
-from dotenv import load_dotenv
 
-# Cargar variables de entorno desde .env
-load_dotenv()
+# Cargar variables de entorno desde .env solo fuera de Render: en producción
+# las variables ya existen y así ni siquiera se importa dotenv
+if not os.getenv('RENDER'):
+    from dotenv import load_dotenv
+    load_dotenv(override=False)
+
+# Variables requeridas: agregar una nueva key es una sola línea aquí
+REQUIRED = ("TELEGRAM_BOT_TOKEN", "GEMINI_API_KEY", "WEATHER_API_KEY")
+_env = {key: os.getenv(key) for key in REQUIRED}
+
+_missing = [key for key, value in _env.items() if not value]
+if _missing:
+    raise ValueError(f"❌ Variables no encontradas en .env: {', '.join(_missing)}")
 
 # Configuración del Bot de Telegram
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_TOKEN = _env["TELEGRAM_BOT_TOKEN"]
 
 # Configuración de Gemini AI
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_API_KEY = _env["GEMINI_API_KEY"]
 
 # Configuración de Weather API
-WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
-
-# Validar que las variables existan
-if not TELEGRAM_TOKEN:
-    raise ValueError("❌ TELEGRAM_BOT_TOKEN no encontrado en .env")
-
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY no encontrado en .env")
-
-if not WEATHER_API_KEY:
-    raise ValueError("❌ WEATHER_API_KEY no encontrado en .env")
+WEATHER_API_KEY = _env["WEATHER_API_KEY"]
 
-print("✅ Configuración cargada correctamente")
\ No newline at end of file
+print("✅ Configuración cargada correctamente")
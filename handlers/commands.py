@@ -1,24 +1,30 @@
+import asyncio
 import logging
+import re
+import time
+from collections import defaultdict, deque
 from telegram import Update
 from telegram.ext import ContextTypes
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta, timezone
 from utils.weather_api import weather_api
-from utils.gemini_client import gemini_client
+from utils.gemini_client import gemini_client, gemini_semaphore, ERROR_RESPONSES
+from utils.conversation_manager import conversation_manager
 
 # Importar las nuevas Tools
 from utils.tools import currency_converter, translator, lyrics_finder
+from utils.redis_cache import get_cached_translation, cache_translation
+from utils.singleflight import singleflight
+from handlers.messages import send_chunks, _split_markdown
 
 logger = logging.getLogger(__name__)
 
+# Zona horaria de El Salvador: UTC-6 fijo (sin horario de verano), así que
+# un offset constante evita la búsqueda en la base tz en cada datetime.now()
+SV_TZ = timezone(timedelta(hours=-6), 'America/El_Salvador')
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Comando /start - Mensaje de bienvenida
-    """
-    user_name = update.effective_user.first_name
-    
-    welcome_message = f"""
+# Templates estáticos construidos una sola vez; los handlers solo sustituyen
+# los campos dinámicos con .format()
+WELCOME_TMPL = """
 🤖 ¡Hola {user_name}! Bienvenido a tu Bot Inteligente
 
 Soy un asistente potenciado por **Google Gemini AI** que puede ayudarte con:
@@ -35,13 +41,8 @@ Soy un asistente potenciado por **Google Gemini AI** que puede ayudarte con:
 
 💬 **¡Simplemente escribe tu pregunta y te responderé!**
     """
-    
-    await update.message.reply_text(welcome_message)
-    logger.info(f"Usuario {user_name} inició el bot")
-
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    help_text = """
+HELP_TEXT = """
 📋 **COMANDOS DISPONIBLES:**
 
 **Comandos básicos:**
@@ -76,36 +77,156 @@ Usa /reset si quieres empezar de cero.
 
 ⚡ **Powered by Google Gemini AI, OpenWeatherMap & LangChain Tools**
     """
-    
-    await update.message.reply_text(help_text, parse_mode='Markdown')
 
+# Detección rápida de español para /traducir: un frozenset y un regex
+# precompilado hacen un solo pase en C en vez de 16 búsquedas de substring
+ES_CHARS = frozenset('áéíóúñ¿¡')
+ES_WORDS_RE = re.compile(r'\b(hola|buenos|días|cómo|qué|gracias|por|favor)\b', re.IGNORECASE)
 
-async def fecha_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# Rate limit por usuario (token bucket): corta el spam antes de construir
+# strings o tocar Gemini/APIs externas
+RATE_LIMIT_MSG = "⏳ Vas muy rápido. Espera unos segundos e intenta de nuevo."
+RATE_TOKENS_PER_SEC = 1.0
+RATE_BURST = 5.0
+_buckets = {}  # user_id -> [tokens, último refill (monotonic)]
+
+
+def _allow(user_id: int) -> bool:
     """
-    Comando /fecha - Muestra fecha y hora actual
+    Token bucket por usuario: True si el comando puede procesarse
     """
-    # Zona horaria de El Salvador
-    timezone = pytz.timezone('America/El_Salvador')
-    now = datetime.now(timezone)
-    
-    # Formatear fecha en español
-    dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    meses = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
-             'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
-    
-    dia_semana = dias[now.weekday()]
-    mes = meses[now.month - 1]
-    
-    fecha_formateada = f"""
+    now = time.monotonic()
+    bucket = _buckets.get(user_id)
+    if bucket is None:
+        _buckets[user_id] = [RATE_BURST - 1.0, now]
+        return True
+
+    tokens = min(RATE_BURST, bucket[0] + (now - bucket[1]) * RATE_TOKENS_PER_SEC)
+    bucket[1] = now
+    if tokens < 1.0:
+        bucket[0] = tokens
+        return False
+    bucket[0] = tokens - 1.0
+    return True
+
+
+# Mensaje de uso de /clima: constante para no reconstruirlo en cada llamada
+# mal formada (también es la ruta favorita del spam)
+CLIMA_USAGE_ERROR = (
+    "❌ Por favor especifica una ciudad.\n\n"
+    "**Uso correcto:**\n"
+    "`/clima San Salvador`\n"
+    "`/clima Madrid`\n"
+    "`/clima Tokyo`"
+)
+
+# Prompt de /chiste precompilado: solo categoría y timestamp varían por llamada
+CHISTE_PROMPT = """
+        Genera UN SOLO chiste corto y original sobre: {categoria}
+        Debe ser apropiado, divertido y creativo.
+        Formato: Solo el chiste con un emoji al inicio.
+        ID único: {timestamp}
+        """
+
+# Respuesta de /chiste precompilada: solo categoría y chiste varían
+CHISTE_RESP_TMPL = """
+🎭 **CHISTE DE {cat_upper}**
+
+{chiste}
+
+---
+💡 _Prueba: /chiste programacion, /chiste ciencia_
+        """
+
+# Pool rotativo de chistes por categoría: la mayoría de los /chiste se sirven
+# del pool sin esperar a Gemini; se rellena en segundo plano bajo el umbral
+JOKE_POOL = defaultdict(lambda: deque(maxlen=20))
+JOKE_POOL_MIN = 5
+
+
+async def _refill_jokes(cat_key: str, categoria: str):
+    """
+    Genera un chiste nuevo con Gemini y lo agrega al pool de la categoría
+    (corre como task en segundo plano, no bloquea la respuesta al usuario)
+    """
+    try:
+        prompt = CHISTE_PROMPT.format(categoria=categoria, timestamp=int(time.time()))
+        async with gemini_semaphore:
+            chiste = await gemini_client.aget_simple_response(prompt)
+        # No cachear fallos: aget_simple_response no lanza, devuelve un
+        # mensaje de error amigable que no debe rotar como chiste
+        if chiste and chiste not in ERROR_RESPONSES:
+            JOKE_POOL[cat_key].append(chiste)
+    except Exception as e:
+        logger.error("❌ Error al rellenar pool de chistes: %s", e)
+
+RESET_TMPL = """
+🔄 **Conversación reiniciada**
+
+¡Hola de nuevo, {user_name}! 👋
+
+He limpiado nuestro historial de conversación.
+Ahora empezamos desde cero con memoria fresca.
+
+📋 **Comandos rápidos:**
+• /help - Ver ayuda completa
+• /fecha - Fecha y hora actual
+• /clima [ciudad] - Consultar clima
+• /convertir - Convertir monedas
+• /traducir - Traducir textos
+• /letra - Buscar letras
+
+💬 **¿En qué puedo ayudarte ahora?**
+    """
+
+# Constantes de /fecha: tuplas y template precalculados una sola vez
+DIAS = ('Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo')
+MESES = ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+         'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre')
+FECHA_FMT = """
 📅 **FECHA Y HORA ACTUAL**
 
-🗓️ {dia_semana}, {now.day} de {mes} de {now.year}
-🕐 Hora: {now.strftime('%I:%M:%S %p')}
+🗓️ {dia}, {d} de {mes} de {y}
+🕐 Hora: {hora}
 🌎 Zona horaria: El Salvador (GMT-6)
 
 _Información actualizada en tiempo real_
     """
-    
+
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Comando /start - Mensaje de bienvenida
+    """
+    user_name = update.effective_user.first_name
+
+    await update.message.reply_text(WELCOME_TMPL.format(user_name=user_name))
+    logger.info("Usuario %s inició el bot", user_name)
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(HELP_TEXT, parse_mode='Markdown')
+
+
+async def fecha_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Comando /fecha - Muestra fecha y hora actual
+    """
+    now = datetime.now(SV_TZ)
+
+    # Reloj 12h formateado a mano: evita el paso por strftime/locale
+    h12 = now.hour % 12 or 12
+    ampm = 'AM' if now.hour < 12 else 'PM'
+
+    # Solo los campos dinámicos se sustituyen en el template
+    fecha_formateada = FECHA_FMT.format(
+        dia=DIAS[now.weekday()],
+        d=now.day,
+        mes=MESES[now.month - 1],
+        y=now.year,
+        hora=f"{h12:02d}:{now.minute:02d}:{now.second:02d} {ampm}"
+    )
+
     await update.message.reply_text(fecha_formateada, parse_mode='Markdown')
     logger.info("Comando /fecha ejecutado")
 
@@ -115,40 +236,41 @@ async def clima_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Comando /clima - Obtiene información del clima de una ciudad
     Uso: /clima [nombre de ciudad]
     """
+    if not _allow(update.effective_user.id):
+        await update.message.reply_text(RATE_LIMIT_MSG)
+        return
+
     chat_id = update.effective_chat.id
     
     # Verificar que se proporcionó una ciudad
     if not context.args:
-        await update.message.reply_text(
-            "❌ Por favor especifica una ciudad.\n\n"
-            "**Uso correcto:**\n"
-            "`/clima San Salvador`\n"
-            "`/clima Madrid`\n"
-            "`/clima Tokyo`",
-            parse_mode='Markdown'
-        )
+        await update.message.reply_text(CLIMA_USAGE_ERROR, parse_mode='Markdown')
         return
     
     # Obtener nombre de la ciudad
     ciudad = " ".join(context.args)
     
     try:
-        # Mostrar indicador de "escribiendo..."
-        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-        
-        logger.info(f"🌤️ Consultando clima para: {ciudad}")
-        
-        # Obtener datos del clima
-        weather_data = weather_api.get_current_weather(ciudad)
+        # Lanzar el indicador "escribiendo..." en paralelo con la consulta:
+        # son dos I/O independientes, no hay por qué serializarlos
+        typing_task = asyncio.create_task(
+            context.bot.send_chat_action(chat_id=chat_id, action="typing")
+        )
+
+        logger.info("🌤️ Consultando clima para: %s", ciudad)
+
+        # Obtener datos del clima (async: otras consultas siguen en paralelo)
+        weather_data = await weather_api.get_current_weather(ciudad)
+        await typing_task
         
         # Formatear y enviar mensaje
         message = weather_api.format_weather_message(weather_data)
         await update.message.reply_text(message, parse_mode='Markdown')
         
-        logger.info(f"✅ Clima enviado para: {ciudad}")
+        logger.info("✅ Clima enviado para: %s", ciudad)
         
     except Exception as e:
-        logger.error(f"❌ Error en comando /clima: {e}")
+        logger.error("❌ Error en comando /clima: %s", e)
         await update.message.reply_text(
             "❌ Ocurrió un error al obtener el clima. Por favor intenta de nuevo."
         )
@@ -158,41 +280,26 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Comando /reset - Limpia el historial de conversación
     """
-    from utils.conversation_manager import conversation_manager
-    
     user_id = update.effective_user.id
     user_name = update.effective_user.first_name
     
     # Limpiar historial
     conversation_manager.clear_history(user_id)
-    
-    reset_message = f"""
-🔄 **Conversación reiniciada**
 
-¡Hola de nuevo, {user_name}! 👋
-
-He limpiado nuestro historial de conversación.
-Ahora empezamos desde cero con memoria fresca.
-
-📋 **Comandos rápidos:**
-• /help - Ver ayuda completa
-• /fecha - Fecha y hora actual
-• /clima [ciudad] - Consultar clima
-• /convertir - Convertir monedas
-• /traducir - Traducir textos
-• /letra - Buscar letras
-
-💬 **¿En qué puedo ayudarte ahora?**
-    """
-    
-    await update.message.reply_text(reset_message, parse_mode='Markdown')
-    logger.info(f"Historial reiniciado para usuario {user_name} ({user_id})")
+    await update.message.reply_text(
+        RESET_TMPL.format(user_name=user_name), parse_mode='Markdown'
+    )
+    logger.info("Historial reiniciado para usuario %s (%s)", user_name, user_id)
 
 
 async def chiste_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Comando /chiste - Genera chistes usando Gemini AI
     """
+    if not _allow(update.effective_user.id):
+        await update.message.reply_text(RATE_LIMIT_MSG)
+        return
+
     chat_id = update.effective_chat.id
     categoria = " ".join(context.args) if context.args else "general"
     
@@ -201,34 +308,40 @@ async def chiste_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-        
-        import time
-        timestamp = int(time.time())
-        
-        prompt = f"""
-        Genera UN SOLO chiste corto y original sobre: {categoria}
-        Debe ser apropiado, divertido y creativo.
-        Formato: Solo el chiste con un emoji al inicio.
-        ID único: {timestamp}
-        """
-        
-        chiste = gemini_client.get_simple_response(prompt)
-        
-        respuesta = f"""
-🎭 **CHISTE DE {categoria.upper()}**
+        # "escribiendo..." en paralelo con la generación del chiste
+        typing_task = asyncio.create_task(
+            context.bot.send_chat_action(chat_id=chat_id, action="typing")
+        )
 
-{chiste}
+        cat_key = categoria.casefold()
+        pool = JOKE_POOL[cat_key]
 
----
-💡 _Prueba: /chiste programacion, /chiste ciencia_
-        """
+        if pool:
+            # Servir del pool y rotar (sin round-trip a Gemini)
+            chiste = pool.popleft()
+            pool.append(chiste)
+        else:
+            # Pool vacío: única llamada directa a Gemini (acotada y fuera del loop)
+            prompt = CHISTE_PROMPT.format(categoria=categoria, timestamp=int(time.time()))
+            async with gemini_semaphore:
+                chiste = await gemini_client.aget_simple_response(prompt)
+            # Servirlo igual, pero no guardar mensajes de error en el pool
+            if chiste not in ERROR_RESPONSES:
+                pool.append(chiste)
+
+        # Rellenar en segundo plano si el pool está bajo
+        if len(pool) < JOKE_POOL_MIN:
+            asyncio.create_task(_refill_jokes(cat_key, categoria))
+
+        await typing_task
         
+        respuesta = CHISTE_RESP_TMPL.format(cat_upper=categoria.upper(), chiste=chiste)
+
         await update.message.reply_text(respuesta, parse_mode='Markdown')
-        logger.info(f"✅ Chiste enviado (categoría: {categoria})")
+        logger.info("✅ Chiste enviado (categoría: %s)", categoria)
         
     except Exception as e:
-        logger.error(f"❌ Error en /chiste: {e}")
+        logger.error("❌ Error en /chiste: %s", e)
         await update.message.reply_text("❌ Error al generar chiste.")
 
 
@@ -242,6 +355,10 @@ async def convertir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Uso: /convertir [cantidad] [moneda_origen] [moneda_destino]
     Ejemplos: /convertir 100 USD EUR
     """
+    if not _allow(update.effective_user.id):
+        await update.message.reply_text(RATE_LIMIT_MSG)
+        return
+
     chat_id = update.effective_chat.id
     
     # Verificar argumentos
@@ -266,15 +383,29 @@ async def convertir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cantidad = float(context.args[0])
         moneda_origen = context.args[1].upper()
         moneda_destino = context.args[2].upper()
-        
-        logger.info(f"💱 Convirtiendo {cantidad} {moneda_origen} → {moneda_destino}")
+
+        # Validación local contra la lista precalentada: los códigos
+        # inválidos se rechazan sin gastar un request a la API
+        codes = await asyncio.to_thread(currency_converter.valid_codes)
+        if codes and (moneda_origen not in codes or moneda_destino not in codes):
+            invalida = moneda_origen if moneda_origen not in codes else moneda_destino
+            await update.message.reply_text(
+                f"❌ Moneda '{invalida}' no encontrada. "
+                "Usa códigos como USD, EUR, GBP, MXN, etc."
+            )
+            return
+
+        logger.info("💱 Convirtiendo %s %s → %s", cantidad, moneda_origen, moneda_destino)
         
         # Usar CurrencyConverter
-        result = currency_converter.convert(cantidad, moneda_origen, moneda_destino)
+        result = await singleflight(
+            f"cv:{cantidad}:{moneda_origen}:{moneda_destino}",
+            lambda: asyncio.to_thread(currency_converter.convert, cantidad, moneda_origen, moneda_destino)
+        )
         message = currency_converter.format_result(result)
         
         await update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"✅ Conversión enviada")
+        logger.info("✅ Conversión enviada")
         
     except ValueError:
         await update.message.reply_text(
@@ -283,7 +414,7 @@ async def convertir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='Markdown'
         )
     except Exception as e:
-        logger.error(f"❌ Error en /convertir: {e}")
+        logger.error("❌ Error en /convertir: %s", e)
         await update.message.reply_text("❌ Error al convertir monedas.")
 
 
@@ -293,6 +424,10 @@ async def traducir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Uso: /traducir [texto]
     Detecta automáticamente el idioma y traduce (inglés ↔ español por defecto)
     """
+    if not _allow(update.effective_user.id):
+        await update.message.reply_text(RATE_LIMIT_MSG)
+        return
+
     chat_id = update.effective_chat.id
     
     # Verificar que hay texto
@@ -316,26 +451,33 @@ async def traducir_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Obtener texto completo
         texto = " ".join(context.args)
         
-        logger.info(f"🌍 Traduciendo: {texto[:50]}...")
+        logger.info("🌍 Traduciendo: %.50s...", texto)
         
         # Detectar idioma básico y traducir
         # Si tiene caracteres latinos/español, traducir a inglés
         # Si es inglés, traducir a español
-        tiene_espanol = any(c in texto.lower() for c in ['á', 'é', 'í', 'ó', 'ú', 'ñ', '¿', '¡'])
-        palabras_espanol = ['hola', 'buenos', 'días', 'cómo', 'qué', 'gracias', 'por', 'favor']
-        es_espanol = tiene_espanol or any(palabra in texto.lower() for palabra in palabras_espanol)
+        es_espanol = (
+            not ES_CHARS.isdisjoint(texto.lower())
+            or ES_WORDS_RE.search(texto) is not None
+        )
         
         target_lang = 'en' if es_espanol else 'es'
-        
-        # Usar Translator
-        result = translator.translate(texto, 'auto', target_lang)
+
+        # Usar Translator (con cache global Redis si está configurado)
+        result = await get_cached_translation(texto, target_lang)
+        if result is None:
+            result = await singleflight(
+                f"tr:{target_lang}:{texto}",
+                lambda: asyncio.to_thread(translator.translate, texto, 'auto', target_lang)
+            )
+            await cache_translation(texto, target_lang, result)
         message = translator.format_result(result)
         
         await update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"✅ Traducción enviada")
+        logger.info("✅ Traducción enviada")
         
     except Exception as e:
-        logger.error(f"❌ Error en /traducir: {e}")
+        logger.error("❌ Error en /traducir: %s", e)
         await update.message.reply_text("❌ Error al traducir texto.")
 
 
@@ -345,6 +487,10 @@ async def letra_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Uso: /letra [Artista] - [Canción]
     Ejemplos: /letra Bad Bunny - Tití Me Preguntó
     """
+    if not _allow(update.effective_user.id):
+        await update.message.reply_text(RATE_LIMIT_MSG)
+        return
+
     chat_id = update.effective_chat.id
     
     # Verificar que hay query
@@ -369,7 +515,7 @@ async def letra_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Obtener query completa
         query = " ".join(context.args)
         
-        logger.info(f"🎵 Buscando letra: {query}")
+        logger.info("🎵 Buscando letra: %s", query)
         
         # Parsear artista y canción
         if ' - ' not in query:
@@ -385,23 +531,22 @@ async def letra_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cancion = parts[1].strip()
         
         # Usar LyricsFinder
-        result = lyrics_finder.search_lyrics(artista, cancion)
+        result = await singleflight(
+            f"ly:{artista.lower()}:{cancion.lower()}",
+            lambda: asyncio.to_thread(lyrics_finder.search_lyrics, artista, cancion)
+        )
         
         # Formatear resultado (limitar a 30 líneas para Telegram)
         message = lyrics_finder.format_result(result, max_lines=25)
         
-        # Si el mensaje es muy largo, dividirlo
+        # Si el mensaje es muy largo, dividirlo y enviarlo en paralelo
         if len(message) > 4000:
-            # Enviar en partes
-            parts = [message[i:i+3800] for i in range(0, len(message), 3800)]
-            for part in parts:
-                await update.message.reply_text(part, parse_mode='Markdown')
-                await context.bot.send_chat_action(chat_id=chat_id, action="typing")
+            await send_chunks(update, _split_markdown(message, limit=3800))
         else:
             await update.message.reply_text(message, parse_mode='Markdown')
         
-        logger.info(f"✅ Letra enviada: {artista} - {cancion}")
+        logger.info("✅ Letra enviada: %s - %s", artista, cancion)
         
     except Exception as e:
-        logger.error(f"❌ Error en /letra: {e}")
+        logger.error("❌ Error en /letra: %s", e)
         await update.message.reply_text("❌ Error al buscar letra de canción.")
\ No newline at end of file
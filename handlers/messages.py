@@ -1,5 +1,10 @@
+import asyncio
 import logging
+import re
+from collections import defaultdict
+from functools import lru_cache
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
@@ -7,15 +12,226 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.gemini_client import gemini_client
+from utils.gemini_client import gemini_client, gemini_semaphore
 from utils.conversation_manager import conversation_manager
 
-# IMPORTAR AGENTE LANGCHAIN
-from utils.agent_handler import intelligent_agent, should_use_agent
-from utils.tools import currency_tool, translator_tool
+# IMPORTAR AGENTE LANGCHAIN (get_agent es perezoso y lru_cache(1): el
+# agente se construye recién en el primer mensaje que lo necesita, no
+# al importar este módulo)
+from utils.agent_handler import get_agent, should_use_agent
+from utils.tools import currency_tool, translator_tool, lyrics_tool
+from utils.redis_cache import get_cached_translation, cache_translation
 
 logger = logging.getLogger(__name__)
 
+# Regexes de ruteo precompilados: un solo pase en C por mensaje en lugar de
+# docenas de búsquedas de substring por palabra clave
+NUM_RE = re.compile(r"\b[0-9]+(?:[\.,][0-9]+)?\b")
+CURRENCY_RE = re.compile(
+    r"\b(dolar(es)?|dólar(es)?|euros?|pesos?|yen(es)?|libras?"
+    r"|usd|eur|mxn|jpy|gbp|cad|aud|brl|inr)\b",
+    re.IGNORECASE
+)
+TRANSLATION_RE = re.compile(
+    r"traducir|traduce|translate|cómo se dice|how to say"
+    r"|en español|al español|to english|al inglés|en ingles",
+    re.IGNORECASE
+)
+LYRICS_RE = re.compile(
+    r"\b(letra de|busca (?:la )?letra|lyrics (?:of|de|for))\b",
+    re.IGNORECASE
+)
+
+# Respuestas contextuales según el emoji del sticker
+_EMOJI_RESPONSES = {
+    '👍': 'Genial! 😊',
+    '❤️': 'Gracias! ❤️',
+    '😂': 'Jaja! 😄',
+    '🤔': '¿En qué estás pensando?',
+    '👋': 'Hola! 👋',
+    '🎉': 'A celebrar! 🎊',
+    '😢': '¿Todo bien?',
+    '🔥': 'Increíble! 🔥',
+    '💯': 'Perfecto! 💯',
+    '🤝': 'De acuerdo! 🤝',
+}
+
+
+@lru_cache(maxsize=4096)
+def _route(user_message: str):
+    """
+    Decide el ruteo de un mensaje: (usar agente, conversión, traducción).
+    Es determinista, así que los mensajes cortos repetidos ("hola",
+    "gracias") se resuelven desde cache sin re-escanear los regexes
+    """
+    return (
+        should_use_agent(user_message),
+        NUM_RE.search(user_message) is not None
+        and CURRENCY_RE.search(user_message) is not None,
+        TRANSLATION_RE.search(user_message) is not None,
+        LYRICS_RE.search(user_message) is not None,
+    )
+
+
+def _split_markdown(text: str, limit: int = 4000):
+    """
+    Divide un texto largo en fragmentos de hasta `limit` caracteres,
+    cortando en el salto de párrafo/línea/espacio más cercano para no
+    partir tokens de Markdown a mitad de palabra (lo que haría fallar
+    el envío con parse_mode y costaría un round-trip extra de fallback)
+    """
+    start = 0
+    n = len(text)
+    while start < n:
+        if n - start <= limit:
+            yield text[start:]
+            return
+        end = start + limit
+        cut = text.rfind('\n\n', start, end)
+        if cut <= start:
+            cut = text.rfind('\n', start, end)
+        if cut <= start:
+            cut = text.rfind(' ', start, end)
+        if cut <= start:
+            cut = end
+        yield text[start:cut]
+        # Saltar el separador en el que cortamos
+        start = cut
+        while start < n and text[start] in ' \n':
+            start += 1
+
+
+# Texto sin metacaracteres de Markdown se envía con parse_mode=None:
+# el primer intento nunca falla y se ahorra el round-trip de fallback
+_MD_CHARS_RE = re.compile(r'[_*`\[\]]')
+
+
+# Límites de la Bot API: ~30 msg/s globales y ~1 msg/s por chat. El lock
+# por chat es FIFO, así que los fragmentos llegan en orden aunque las
+# tareas se lancen todas de golpe.
+_send_global = asyncio.Semaphore(30)
+_send_chat_locks = defaultdict(asyncio.Lock)
+
+# Orden por chat: un chat procesa sus mensajes secuencialmente, pero un
+# Gemini lento en el chat A ya no bloquea al chat B
+_chat_locks = defaultdict(asyncio.Lock)
+
+
+async def send_chunks(update: Update, chunks, parse_mode=ParseMode.MARKDOWN):
+    """
+    Envía los fragmentos de una respuesta larga solapando los round-trips
+    a Telegram, respetando los límites de rate y reintentando ante RetryAfter
+    """
+    chat_lock = _send_chat_locks[update.effective_chat.id]
+
+    async def _send(chunk):
+        pm = parse_mode if _MD_CHARS_RE.search(chunk) else None
+        async with _send_global, chat_lock:
+            try:
+                await update.message.reply_text(chunk, parse_mode=pm)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await update.message.reply_text(chunk, parse_mode=pm)
+            except Exception:
+                # Fallback sin Markdown
+                await update.message.reply_text(chunk)
+
+    await asyncio.gather(
+        *[asyncio.create_task(_send(chunk)) for chunk in chunks],
+        return_exceptions=True
+    )
+
+
+# Streaming: editar el placeholder como máximo cada 0.5s respeta el
+# límite de ~1 msg/s por chat y aun así la respuesta se ve "en vivo"
+_STREAM_EDIT_INTERVAL = 0.5
+_STREAM_MIN_FIRST = 24
+
+
+async def _stream_gemini_reply(update, user_message, conversation_history, user_name):
+    """
+    Consume el stream de Gemini mostrando la respuesta parcial en un
+    mensaje que se va editando (con debounce). Devuelve (placeholder,
+    texto completo); placeholder es None si la respuesta terminó antes
+    de acumular contenido suficiente para el primer envío
+    """
+    loop = asyncio.get_running_loop()
+    parts = []
+    placeholder = None
+    last_edit = 0.0
+
+    try:
+        async for piece in gemini_client.astream_response(
+            user_message=user_message,
+            conversation_history=conversation_history,
+            user_name=user_name,
+        ):
+            parts.append(piece)
+            text = ''.join(parts)
+
+            # Pasado el límite de un mensaje dejamos de editar; el texto
+            # completo se trocea al final con send_chunks
+            if len(text) > 4000:
+                continue
+
+            now = loop.time()
+            if placeholder is None:
+                if len(text) >= _STREAM_MIN_FIRST:
+                    # Parciales siempre en texto plano: el Markdown puede
+                    # venir cortado a mitad de token
+                    placeholder = await update.message.reply_text(text + " ▌")
+                    last_edit = now
+            elif now - last_edit >= _STREAM_EDIT_INTERVAL:
+                try:
+                    await placeholder.edit_text(text + " ▌")
+                    last_edit = now
+                except RetryAfter as e:
+                    # Posponer la próxima edición; la versión final llega igual
+                    last_edit = now + e.retry_after
+                except Exception:
+                    pass
+    except Exception:
+        # Stream cortado a mitad de camino: borrar el parcial para que el
+        # fallback del caller no deje un mensaje huérfano con el cursor
+        await _discard_placeholder(placeholder)
+        raise
+
+    return placeholder, ''.join(parts)
+
+
+async def _discard_placeholder(placeholder):
+    """
+    Borra (mejor esfuerzo) un mensaje de streaming que quedó a medias
+    """
+    if placeholder is not None:
+        try:
+            await placeholder.delete()
+        except Exception:
+            pass
+
+
+async def _finalize_placeholder(placeholder, text):
+    """
+    Edición final del mensaje de streaming: texto completo, con Markdown
+    si aplica y fallback a texto plano (igual que el envío normal)
+    """
+    pm = ParseMode.MARKDOWN if _MD_CHARS_RE.search(text) else None
+    try:
+        await placeholder.edit_text(text, parse_mode=pm)
+    except RetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        try:
+            await placeholder.edit_text(text, parse_mode=pm)
+        except Exception:
+            pass
+    except Exception:
+        # Markdown inválido (o texto idéntico al ya mostrado)
+        if pm is not None:
+            try:
+                await placeholder.edit_text(text)
+            except Exception:
+                pass
+
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -31,167 +247,217 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_name = user.first_name
     chat_id = update.effective_chat.id
     
-    logger.info(f"💬 [{user_name}] {user_message}")
+    logger.info("💬 [%s] %.200s", user_name, user_message)
     
-    # Verificar servicios disponibles
-    if not gemini_client and not intelligent_agent:
+    # Verificar servicios disponibles (solo construir el agente si Gemini
+    # no está: get_agent() es la única alternativa en ese caso)
+    if not gemini_client and not get_agent():
         await update.message.reply_text(
             "❌ Los servicios de IA no están disponibles. Intenta más tarde."
         )
         return
     
-    try:
-        # Mostrar indicador "escribiendo..."
-        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-        
-        # DECISIÓN MEJORADA: ¿Usar agente o Gemini directo?
-        use_agent = should_use_agent(user_message)
-
-        # Heurística rápida: si la consulta claramente pide conversión o traducción,
-        # invocar directamente la tool correspondiente para mayor confiabilidad.
-        import re
-        lower = user_message.lower()
-
-        # Detectar conversiones: número + palabra de moneda o código
-        number_present = bool(re.search(r"\b[0-9]+(?:[\.,][0-9]+)?\b", user_message))
-        currency_words = ['dolar', 'dólar', 'dolares', 'dólares', 'euro', 'euros', 'peso', 'pesos', 'yen', 'yene', 'libra',
-                          'usd', 'eur', 'mxn', 'jpy', 'gbp', 'cad', 'aud', 'brl', 'inr']
-        has_currency_word = any(w in lower for w in currency_words)
-
-        # Detectar traducciones: palabras clave típicas
-        translation_words = ['traducir', 'traduce', 'translate', 'cómo se dice', 'how to say', 'en español', 'al español', 'to english', 'al inglés', 'en ingles']
-        has_translation = any(w in lower for w in translation_words)
-
-        # Si detectamos conversión de monedas de forma explícita, usar la tool directamente
-        if number_present and has_currency_word:
-            try:
-                logger.info(f"🔧 Llamando directamente a CurrencyTool para: {user_message}")
-                tool_result = currency_tool.func(user_message)
-                # Guardar en historial
-                conversation_manager.add_message(user_id, 'user', user_message)
-                conversation_manager.add_message(user_id, 'assistant', tool_result)
-                response = tool_result
-                # Enviar respuesta y saltar el flujo del agente
+    # Un mismo chat procesa sus mensajes en orden; chats distintos
+    # corren en paralelo (el trabajo pesado ya va por to_thread)
+    async with _chat_locks[chat_id]:
+        try:
+            # Mensaje de streaming ya en pantalla (solo ruta Gemini directa)
+            placeholder = None
+
+            # Mostrar indicador "escribiendo..." en paralelo con el trabajo:
+            # su round-trip se solapa con la llamada al LLM/tool
+            typing_task = asyncio.create_task(
+                context.bot.send_chat_action(chat_id=chat_id, action="typing")
+            )
+
+            # DECISIÓN MEJORADA: ¿Usar agente, tool directa o Gemini?
+            # Los mensajes largos saltan el cache LRU para no contaminarlo
+            route = _route if len(user_message) <= 256 else _route.__wrapped__
+            use_agent, needs_conversion, has_translation, needs_lyrics = route(user_message)
+
+            # Si detectamos conversión de monedas de forma explícita, usar la tool directamente
+            if needs_conversion:
                 try:
-                    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
-                except Exception:
-                    await update.message.reply_text(response)
-                logger.info("✅ CurrencyTool respondió directamente")
-                return
-            except Exception as e:
-                logger.error(f"❌ Error al usar CurrencyTool directamente: {e}")
+                    logger.info("🔧 Llamando directamente a CurrencyTool para: %.100s", user_message)
+                    tool_result = await asyncio.to_thread(currency_tool.func, user_message)
+                    # Guardar en historial
+                    conversation_manager.add_message(user_id, 'user', user_message)
+                    conversation_manager.add_message(user_id, 'assistant', tool_result)
+                    response = tool_result
+                    # Enviar respuesta y saltar el flujo del agente
+                    await typing_task
+                    try:
+                        await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+                    except Exception:
+                        await update.message.reply_text(response)
+                    logger.info("✅ CurrencyTool respondió directamente")
+                    return
+                except Exception as e:
+                    logger.error("❌ Error al usar CurrencyTool directamente: %s", e)
 
-        # Si detectamos una petición de traducción explícita, usar la tool directamente
-        if has_translation:
-            try:
-                logger.info(f"🔧 Llamando directamente a TranslatorTool para: {user_message}")
-                tool_result = translator_tool.func(user_message)
-                conversation_manager.add_message(user_id, 'user', user_message)
-                conversation_manager.add_message(user_id, 'assistant', tool_result)
-                response = tool_result
+            # Si detectamos una petición de traducción explícita, usar la tool directamente
+            if has_translation:
                 try:
-                    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
-                except Exception:
-                    await update.message.reply_text(response)
-                logger.info("✅ TranslatorTool respondió directamente")
-                return
-            except Exception as e:
-                logger.error(f"❌ Error al usar TranslatorTool directamente: {e}")
+                    logger.info("🔧 Llamando directamente a TranslatorTool para: %.100s", user_message)
+                    cached = await get_cached_translation(user_message, 'tool')
+                    if cached is not None:
+                        tool_result = cached['text']
+                    else:
+                        tool_result = await asyncio.to_thread(translator_tool.func, user_message)
+                        # La tool reporta fallos como strings "❌ ...": no
+                        # cachearlos o un error transitorio se serviría
+                        # como traducción durante todo el TTL
+                        if not tool_result.startswith("❌"):
+                            await cache_translation(user_message, 'tool', {'text': tool_result})
+                    conversation_manager.add_message(user_id, 'user', user_message)
+                    conversation_manager.add_message(user_id, 'assistant', tool_result)
+                    response = tool_result
+                    await typing_task
+                    try:
+                        await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+                    except Exception:
+                        await update.message.reply_text(response)
+                    logger.info("✅ TranslatorTool respondió directamente")
+                    return
+                except Exception as e:
+                    logger.error("❌ Error al usar TranslatorTool directamente: %s", e)
 
-        if use_agent and intelligent_agent:
-            # ================================
-            # USAR AGENTE LANGCHAIN
-            # ================================
-            logger.info(f"🤖 USANDO AGENTE para: {user_message[:50]}")
+            # Si piden explícitamente la letra de una canción, la tool alcanza:
+            # nos ahorramos el ciclo completo de planificación ReAct
+            if needs_lyrics:
+                try:
+                    logger.info("🔧 Llamando directamente a LyricsTool para: %.100s", user_message)
+                    tool_result = await asyncio.to_thread(lyrics_tool.func, user_message)
+                    conversation_manager.add_message(user_id, 'user', user_message)
+                    conversation_manager.add_message(user_id, 'assistant', tool_result)
+                    response = tool_result
+                    await typing_task
+                    try:
+                        await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+                    except Exception:
+                        await update.message.reply_text(response)
+                    logger.info("✅ LyricsTool respondió directamente")
+                    return
+                except Exception as e:
+                    logger.error("❌ Error al usar LyricsTool directamente: %s", e)
+
+            # Materializar el agente recién acá (cacheado tras la primera vez)
+            intelligent_agent = get_agent() if use_agent else None
+
+            if use_agent and intelligent_agent:
+                # ================================
+                # USAR AGENTE LANGCHAIN
+                # ================================
+                logger.info("🤖 USANDO AGENTE para: %.50s", user_message)
             
-            try:
-                response = intelligent_agent.run(user_message)
+                try:
+                    # Ruta async nativa: el ciclo ReAct se solapa con el loop
+                    response = await intelligent_agent.arun(user_message)
                 
-                # Verificar si la respuesta es válida
-                if not response or len(response.strip()) < 10:
-                    logger.warning("⚠️ Respuesta del agente muy corta, usando Gemini como fallback")
-                    raise Exception("Respuesta del agente inválida")
+                    # Verificar si la respuesta es válida
+                    if not response or len(response.strip()) < 10:
+                        logger.warning("⚠️ Respuesta del agente muy corta, usando Gemini como fallback")
+                        raise Exception("Respuesta del agente inválida")
                 
-                # Guardar en historial
-                conversation_manager.add_message(user_id, 'user', user_message)
-                conversation_manager.add_message(user_id, 'assistant', response)
+                    # Guardar en historial
+                    conversation_manager.add_message(user_id, 'user', user_message)
+                    conversation_manager.add_message(user_id, 'assistant', response)
                 
-                logger.info(f"✅ Agente respondió exitosamente")
+                    logger.info("✅ Agente respondió exitosamente")
                 
-            except Exception as agent_error:
-                # Fallback a Gemini si el agente falla
-                logger.error(f"❌ Error en agente, usando Gemini: {agent_error}")
+                except Exception as agent_error:
+                    # Fallback a Gemini si el agente falla
+                    logger.error("❌ Error en agente, usando Gemini: %s", agent_error)
                 
-                # Usar Gemini como respaldo
-                conversation_history = conversation_manager.get_history(user_id)
-                response = gemini_client.get_response_with_context(
-                    user_message=user_message,
-                    conversation_history=conversation_history,
-                    user_name=user_name
-                )
+                    # Usar Gemini como respaldo
+                    conversation_history = conversation_manager.get_history(user_id)
+                    async with gemini_semaphore:
+                        response = await gemini_client.aget_response_with_context(
+                            user_message=user_message,
+                            conversation_history=conversation_history,
+                            user_name=user_name
+                        )
                 
-                conversation_manager.add_message(user_id, 'user', user_message)
-                conversation_manager.add_message(user_id, 'assistant', response)
+                    conversation_manager.add_message(user_id, 'user', user_message)
+                    conversation_manager.add_message(user_id, 'assistant', response)
                 
-                # Añadir nota explicativa
-                response += "\n\n_💡 Nota: Respondí con IA general. Para usar herramientas específicas, intenta con comandos como /convertir, /traducir o /letra_"
+                    # Añadir nota explicativa
+                    response += "\n\n_💡 Nota: Respondí con IA general. Para usar herramientas específicas, intenta con comandos como /convertir, /traducir o /letra_"
             
-        else:
-            # ================================
-            # USAR GEMINI CON CONTEXTO
-            # ================================
-            logger.info(f"💭 USANDO GEMINI para: {user_message[:50]}")
+            else:
+                # ================================
+                # USAR GEMINI CON CONTEXTO
+                # ================================
+                logger.info("💭 USANDO GEMINI para: %.50s", user_message)
             
-            # Obtener historial de conversación
-            conversation_history = conversation_manager.get_history(user_id)
+                # Obtener historial de conversación
+                conversation_history = conversation_manager.get_history(user_id)
             
-            if conversation_history:
-                logger.info(f"📚 Historial: {len(conversation_history)} mensajes")
+                if conversation_history:
+                    logger.info("📚 Historial: %d mensajes", len(conversation_history))
             
-            # Obtener respuesta con contexto
-            response = gemini_client.get_response_with_context(
-                user_message=user_message,
-                conversation_history=conversation_history,
-                user_name=user_name
-            )
-            
-            # Guardar en historial
-            conversation_manager.add_message(user_id, 'user', user_message)
-            conversation_manager.add_message(user_id, 'assistant', response)
-        
-        # ================================
-        # ENVIAR RESPUESTA
-        # ================================
+                # Respuesta en streaming: el usuario ve los primeros tokens
+                # en cuanto llegan, con fallback a la llamada completa
+                async with gemini_semaphore:
+                    try:
+                        placeholder, response = await _stream_gemini_reply(
+                            update, user_message, conversation_history, user_name
+                        )
+                        if not response.strip():
+                            raise ValueError("stream vacío")
+                    except Exception as stream_error:
+                        logger.warning("⚠️ Streaming falló, usando respuesta completa: %s", stream_error)
+                        # Cubre el caso "stream vacío": el helper devolvió
+                        # un placeholder que ya no se va a finalizar
+                        await _discard_placeholder(placeholder)
+                        placeholder = None
+                        response = await gemini_client.aget_response_with_context(
+                            user_message=user_message,
+                            conversation_history=conversation_history,
+                            user_name=user_name
+                        )
+
+                # Guardar en historial
+                conversation_manager.add_message(user_id, 'user', user_message)
+                conversation_manager.add_message(user_id, 'assistant', response)
         
-        # Dividir si es muy largo
-        if len(response) > 4096:
-            chunks = [response[i:i+4000] for i in range(0, len(response), 4000)]
-            for i, chunk in enumerate(chunks):
-                try:
-                    await update.message.reply_text(chunk, parse_mode=ParseMode.MARKDOWN)
-                except Exception:
-                    # Fallback sin Markdown
-                    await update.message.reply_text(chunk)
-                    
-                if i < len(chunks) - 1:
-                    await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-        else:
-            # Intentar con Markdown, fallback a texto plano
-            try:
-                await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
-            except Exception as e:
-                logger.warning(f"⚠️ Error con Markdown, enviando texto plano: {e}")
+            # ================================
+            # ENVIAR RESPUESTA
+            # ================================
+            await typing_task
+
+            if placeholder is not None:
+                # La respuesta ya está (parcial) en pantalla: edición final
+                # con formato; el excedente se envía en mensajes aparte
+                if len(response) > 4096:
+                    chunks = list(_split_markdown(response))
+                    await _finalize_placeholder(placeholder, chunks[0])
+                    await send_chunks(update, chunks[1:])
+                else:
+                    await _finalize_placeholder(placeholder, response)
+            # Dividir si es muy largo
+            elif len(response) > 4096:
+                await send_chunks(update, _split_markdown(response))
+            elif _MD_CHARS_RE.search(response) is None:
+                # Texto plano: sin parse_mode no hay fallo de parseo posible
                 await update.message.reply_text(response)
+            else:
+                # Intentar con Markdown, fallback a texto plano
+                try:
+                    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+                except Exception as e:
+                    logger.warning("⚠️ Error con Markdown, enviando texto plano: %s", e)
+                    await update.message.reply_text(response)
         
-        logger.info(f"✅ Respuesta enviada a {user_name}")
+            logger.info("✅ Respuesta enviada a %s", user_name)
         
-    except Exception as e:
-        logger.error(f"❌ Error al procesar mensaje: {e}", exc_info=True)
-        await update.message.reply_text(
-            "Disculpa, hubo un problema al procesar tu mensaje. "
-            "¿Podrías intentarlo de nuevo? Si el problema persiste, "
-            "intenta usar los comandos directos como /convertir, /traducir o /letra"
-        )
+        except Exception as e:
+            logger.error("❌ Error al procesar mensaje: %s", e, exc_info=True)
+            await update.message.reply_text(
+                "Disculpa, hubo un problema al procesar tu mensaje. "
+                "¿Podrías intentarlo de nuevo? Si el problema persiste, "
+                "intenta usar los comandos directos como /convertir, /traducir o /letra"
+            )
 
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -199,7 +465,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Maneja notas de voz (funcionalidad futura)
     """
     user_name = update.effective_user.first_name
-    logger.info(f"🎙️ Nota de voz recibida de {user_name}")
+    logger.info("🎙️ Nota de voz recibida de %s", user_name)
     
     await update.message.reply_text(
         "🎙️ **Nota de voz recibida**\n\n"
@@ -214,7 +480,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Maneja imágenes (funcionalidad futura con Gemini Vision)
     """
     user_name = update.effective_user.first_name
-    logger.info(f"📸 Imagen recibida de {user_name}")
+    logger.info("📸 Imagen recibida de %s", user_name)
     
     await update.message.reply_text(
         "📸 **Imagen recibida**\n\n"
@@ -230,7 +496,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     user_name = update.effective_user.first_name
     document = update.message.document
-    logger.info(f"📄 Documento recibido de {user_name}: {document.file_name}")
+    logger.info("📄 Documento recibido de %s: %s", user_name, document.file_name)
     
     await update.message.reply_text(
         f"📄 **Documento recibido:** {document.file_name}\n\n"
@@ -248,21 +514,7 @@ async def handle_sticker(update: Update, context: ContextTypes.DEFAULT_TYPE):
     sticker = update.message.sticker
     emoji = sticker.emoji or "🎯"
     
-    logger.info(f"🎨 Sticker recibido de {user_name}: {emoji}")
-    
-    # Respuestas contextuales según el emoji
-    emoji_responses = {
-        '👍': 'Genial! 😊',
-        '❤️': 'Gracias! ❤️',
-        '😂': 'Jaja! 😄',
-        '🤔': '¿En qué estás pensando?',
-        '👋': 'Hola! 👋',
-        '🎉': 'A celebrar! 🎊',
-        '😢': '¿Todo bien?',
-        '🔥': 'Increíble! 🔥',
-        '💯': 'Perfecto! 💯',
-        '🤝': 'De acuerdo! 🤝',
-    }
-    
-    response = emoji_responses.get(emoji, f"{emoji} ¿En qué puedo ayudarte?")
+    logger.info("🎨 Sticker recibido de %s: %s", user_name, emoji)
+
+    response = _EMOJI_RESPONSES.get(emoji) or f"{emoji} ¿En qué puedo ayudarte?"
     await update.message.reply_text(response)
\ No newline at end of file
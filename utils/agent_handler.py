@@ -5,36 +5,26 @@ Agente inteligente que decide automáticamente qué tool usar
 """
 
 import logging
+import os
+import re
+from functools import lru_cache
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 
 from config import GEMINI_API_KEY
+from utils.llm_cache import agent_cache
 from utils.tools import all_tools
 
 logger = logging.getLogger(__name__)
 
+# Las trazas multilinea del AgentExecutor escriben a stdout en cada
+# invocación; en producción quedan apagadas salvo que se pida debug
+_AGENT_DEBUG = os.getenv("AGENT_DEBUG") == "1"
 
-class IntelligentAgent:
-    """
-    Agente LangChain que usa Tools automáticamente
-    """
-    
-    def __init__(self):
-        """
-        Inicializa el agente con Gemini AI y todas las tools
-        """
-        try:
-            # Modelo Gemini para el agente con configuración optimizada
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash-exp",
-                google_api_key=GEMINI_API_KEY,
-                temperature=0.3,  # Más bajo para decisiones más consistentes
-                convert_system_message_to_human=True
-            )
-            
-            # Prompt mejorado y más específico
-            template = """Eres un asistente útil que puede usar herramientas especializadas cuando sea necesario.
+# Prompt ReAct construido una sola vez a nivel de módulo: no depende de
+# nada de la instancia y así no se rearma el template en cada init
+_REACT_TEMPLATE = """Eres un asistente útil que puede usar herramientas especializadas cuando sea necesario.
 
 Tienes acceso a las siguientes herramientas:
 
@@ -42,7 +32,7 @@ Tienes acceso a las siguientes herramientas:
 
 REGLAS IMPORTANTES:
 1. Si el usuario pide convertir monedas o menciona dinero/divisas, DEBES usar CurrencyConverter
-2. Si el usuario pide traducir o menciona idiomas, DEBES usar TextTranslator  
+2. Si el usuario pide traducir o menciona idiomas, DEBES usar TextTranslator
 3. Si el usuario pide letras de canciones o menciona artistas/música, DEBES usar LyricsFinder
 4. Si no necesitas herramientas, responde directamente
 5. SIEMPRE responde en español de forma clara
@@ -76,34 +66,68 @@ Begin!
 
 Question: {input}
 Thought:{agent_scratchpad}"""
-            
-            prompt = PromptTemplate(
-                input_variables=["input", "agent_scratchpad", "tools", "tool_names"],
-                template=template
+
+_REACT_PROMPT = PromptTemplate(
+    input_variables=["input", "agent_scratchpad", "tools", "tool_names"],
+    template=_REACT_TEMPLATE
+)
+
+# Artefactos del proceso ReAct que no deben llegar al usuario
+_ARTIFACT_LINE_RE = re.compile(
+    r'^\s*(?:Thought|Action Input|Action|Observation|Question):.*$\n?',
+    re.MULTILINE
+)
+_FINAL_ANSWER_RE = re.compile(r'Final Answer:\s*(.*)', re.DOTALL)
+
+
+class IntelligentAgent:
+    """
+    Agente LangChain que usa Tools automáticamente
+    """
+    
+    def __init__(self):
+        """
+        Inicializa el agente con Gemini AI y todas las tools
+        """
+        try:
+            # Modelo Gemini para el agente con configuración optimizada
+            self.llm = ChatGoogleGenerativeAI(
+                model="gemini-2.0-flash-exp",
+                google_api_key=GEMINI_API_KEY,
+                temperature=0.3,  # Más bajo para decisiones más consistentes
+                convert_system_message_to_human=True
             )
             
             # Crear agente
             agent = create_react_agent(
                 llm=self.llm,
                 tools=all_tools,
-                prompt=prompt
+                prompt=_REACT_PROMPT
             )
             
             # Crear AgentExecutor con mejor configuración
             self.agent = AgentExecutor(
                 agent=agent,
                 tools=all_tools,
-                verbose=True,  # Para debugging
+                verbose=_AGENT_DEBUG,  # Trazas solo con AGENT_DEBUG=1
                 handle_parsing_errors=True,
-                max_iterations=4,
-                early_stopping_method="generate",
-                return_intermediate_steps=False
+                # Con 3 tools, 2 iteraciones alcanzan (tool + respuesta);
+                # la tercera es margen para un parsing error. "force" corta
+                # sin gastar una llamada extra al LLM como hacía "generate",
+                # y el tope de 8s acota el peor caso en wall-clock
+                max_iterations=3,
+                early_stopping_method="force",
+                max_execution_time=8.0,
+                return_intermediate_steps=False,
+                # Acota el scratchpad a los últimos pasos: menos tokens
+                # re-serializados y re-enviados en cada iteración ReAct
+                trim_intermediate_steps=2
             )
             
             logger.info("✅ Agente LangChain inicializado correctamente")
             
         except Exception as e:
-            logger.error(f"❌ Error al inicializar agente: {e}")
+            logger.error("❌ Error al inicializar agente: %s", e)
             raise
     
     
@@ -112,130 +136,258 @@ Thought:{agent_scratchpad}"""
         Ejecuta el agente con una consulta
         """
         try:
-            logger.info(f"🤖 Agente procesando: {query}")
-            
+            # Las consultas al agente no dependen del historial: respuestas
+            # idénticas se comparten entre usuarios vía cache
+            cached = agent_cache.get(query)
+            if cached is not None:
+                return cached
+
+            logger.info("🤖 Agente procesando: %.100s", query)
+
             # Ejecutar agente
             response = self.agent.invoke({"input": query})
-            
+
             # Extraer respuesta
             if isinstance(response, dict):
                 answer = response.get("output", str(response))
             else:
                 answer = str(response)
-            
+
+            # Corte por límite: no cachear ni devolver el stub en inglés
+            if answer.startswith("Agent stopped"):
+                logger.warning("⏱️ Agente cortado por límite (iteraciones/tiempo): %.100s", query)
+                return (
+                    "Disculpa, esa consulta me tomó demasiado tiempo. "
+                    "¿Podrías intentarlo con el comando directo?"
+                )
+
             # Limpiar respuesta
             answer = self._clean_response(answer)
             
-            logger.info(f"✅ Respuesta del agente: {answer[:100]}...")
+            logger.info("✅ Respuesta del agente: %.100s...", answer)
+            agent_cache.put(query, answer)
             return answer
             
         except Exception as e:
-            logger.error(f"❌ Error en agente: {e}", exc_info=True)
+            logger.error("❌ Error en agente: %s", e, exc_info=True)
             return (
                 "Disculpa, tuve un problema al procesar tu solicitud con las herramientas. "
                 "¿Podrías reformular tu pregunta o usar el comando directo?"
             )
     
     
+    async def arun(self, query: str) -> str:
+        """
+        Variante async de run: usa ainvoke del AgentExecutor para que el
+        ciclo ReAct no bloquee el event loop ni ocupe un worker thread
+        """
+        try:
+            cached = agent_cache.get(query)
+            if cached is not None:
+                return cached
+
+            logger.info("🤖 Agente procesando: %.100s", query)
+
+            response = await self.agent.ainvoke({"input": query})
+
+            if isinstance(response, dict):
+                answer = response.get("output", str(response))
+            else:
+                answer = str(response)
+
+            # Corte por límite: no cachear ni devolver el stub en inglés
+            if answer.startswith("Agent stopped"):
+                logger.warning("⏱️ Agente cortado por límite (iteraciones/tiempo): %.100s", query)
+                return (
+                    "Disculpa, esa consulta me tomó demasiado tiempo. "
+                    "¿Podrías intentarlo con el comando directo?"
+                )
+
+            answer = self._clean_response(answer)
+
+            logger.info("✅ Respuesta del agente: %.100s...", answer)
+            agent_cache.put(query, answer)
+            return answer
+
+        except Exception as e:
+            logger.error("❌ Error en agente: %s", e, exc_info=True)
+            return (
+                "Disculpa, tuve un problema al procesar tu solicitud con las herramientas. "
+                "¿Podrías reformular tu pregunta o usar el comando directo?"
+            )
+
+
     def _clean_response(self, response: str) -> str:
         """
         Limpia la respuesta del agente de artefactos internos
         """
-        # Remover artefactos del proceso ReAct
-        artifacts = [
-            "Thought:", "Action:", "Action Input:", "Observation:", 
-            "Final Answer:", "Question:"
-        ]
-        
-        lines = response.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            # Saltar líneas que son solo artefactos
-            if any(line.strip().startswith(artifact) for artifact in artifacts):
-                # Si es "Final Answer:", tomar el contenido después
-                if line.strip().startswith("Final Answer:"):
-                    content = line.replace("Final Answer:", "").strip()
-                    if content:
-                        cleaned_lines.append(content)
-                continue
-            cleaned_lines.append(line)
-        
-        result = '\n'.join(cleaned_lines).strip()
-        
+        # Caso típico de salida ReAct: todo lo útil viene tras "Final
+        # Answer:" — un solo search lo extrae sin recorrer línea a línea
+        match = _FINAL_ANSWER_RE.search(response)
+        if match:
+            result = match.group(1).strip()
+            if result:
+                return result
+
+        # Sin Final Answer: borrar las líneas de artefactos en un solo
+        # sub multilinea en lugar de un loop Python por línea
+        result = _ARTIFACT_LINE_RE.sub('', response).strip()
+
         # Si quedó vacío, usar la respuesta original
         return result if result else response
 
 
+# Tabla de traducción precompilada: quitar acentos con str.translate es
+# un loop en C por tabla, mucho más barato que unicodedata.normalize por
+# llamada, y permite que las keywords cubran "dolar" y "dólares" con una
+# sola variante sin acento
+_STRIP_ACCENTS = str.maketrans("áéíóúüñÁÉÍÓÚÜÑ", "aeiouunAEIOUUN")
+
+# Palabras clave expandidas por categoría, compiladas una sola vez en una
+# alternación: un pase en C por consulta en lugar de ~45 búsquedas de
+# substring en Python por mensaje
+_AGENT_TRIGGERS = {
+    # Currency - EXPANDIDO
+    'currency': (
+        'convertir', 'conversion', 'conversor', 'convierte', 'cuanto',
+        'moneda', 'divisa', 'cambio', 'cotizacion', 'dolar', 'euro',
+        'peso', 'libra', 'yen', 'usd', 'eur', 'gbp', 'mxn', 'jpy',
+        'currency', 'exchange', 'vale', 'equivale', 'dolares', 'euros'
+    ),
+
+    # Translation - EXPANDIDO
+    'translation': (
+        'traducir', 'traductor', 'traduce', 'traduccion',
+        'translate', 'como se dice', 'que significa', 'en ingles',
+        'en español', 'al ingles', 'al español', 'en frances',
+        'en aleman', 'how to say', 'what does', 'mean in'
+    ),
+
+    # Lyrics - EXPANDIDO
+    'lyrics': (
+        'letra', 'letras', 'cancion', 'song', 'lyrics', 'musica',
+        'artista', 'tema', 'busca letra', 'encuentra letra',
+        'banda', 'cantante', 'interpreta', 'canta', 'album'
+    )
+}
+
+# Como la consulta se normaliza con _STRIP_ACCENTS, TODAS las keywords
+# pasan por la misma tabla al construirse: así una entrada con tilde o ñ
+# en las tuplas de arriba no puede volver a quedar inalcanzable
+def _norm(kw: str) -> str:
+    return kw.translate(_STRIP_ACCENTS)
+
+
+# Una sola alternación con un grupo nombrado por categoría: un único
+# search en C por consulta, y m.lastgroup dice qué categoría disparó.
+# Las palabras largas van primero para que la alternación prefiera el
+# match más específico
+_AGENT_RE = re.compile('|'.join(
+    '(?P<%s>%s)' % (category, '|'.join(
+        re.escape(_norm(kw))
+        for kw in sorted(keywords, key=len, reverse=True)
+    ))
+    for category, keywords in _AGENT_TRIGGERS.items()
+))
+
+# Triage O(1): la mayoría de los triggers son palabras sueltas ("traduce",
+# "letra", "usd"); una intersección de sets resuelve el caso común sin
+# correr las alternaciones
+_SINGLE_WORD_TRIGGERS = frozenset(
+    _norm(kw) for keywords in _AGENT_TRIGGERS.values()
+    for kw in keywords if ' ' not in kw
+)
+
+# Patrones adicionales (pares de frases que deben aparecer juntas)
+_EXTRA_PATTERNS = tuple(
+    tuple(_norm(p) for p in pattern) for pattern in (
+        ('cuánto es', 'en'),  # "cuánto es X en Y"
+        ('cuanto vale', ''),
+        ('precio de', 'en'),
+        ('how much', 'in'),
+        ('what is', 'in'),
+    )
+)
+
+
+# Muletillas de chat: los mensajes más frecuentes del bot ("hola", "ok",
+# "gracias") se descartan con un lookup de set, sin tocar los regexes
+_CHAT_FILLERS = frozenset(map(_norm, {
+    'hola', 'hey', 'hi', 'hello', 'buenas', 'buenos', 'días', 'tardes',
+    'noches', 'ok', 'okay', 'vale', 'dale', 'listo', 'bien', 'genial',
+    'perfecto', 'claro', 'gracias', 'sí', 'si', 'no', 'jaja', 'jajaja',
+    'xd', 'bye', 'chau', 'adiós', 'qué', 'tal', 'cómo', 'estás',
+}))
+
+
 def should_use_agent(query: str) -> bool:
     """
     Decide si usar el agente o respuesta simple de Gemini
     VERSIÓN MEJORADA con mejor detección
     """
-    query_lower = query.lower()
-    
-    # Palabras clave expandidas y más flexibles
-    agent_triggers = {
-        # Currency - EXPANDIDO
-        'currency': [
-            'convertir', 'conversion', 'conversor', 'convierte', 'cuanto',
-            'moneda', 'divisa', 'cambio', 'cotizacion', 'dolar', 'euro', 
-            'peso', 'libra', 'yen', 'usd', 'eur', 'gbp', 'mxn', 'jpy',
-            'currency', 'exchange', 'vale', 'equivale', 'dolares', 'euros'
-        ],
-        
-        # Translation - EXPANDIDO  
-        'translation': [
-            'traducir', 'traductor', 'traduce', 'traduccion',
-            'translate', 'como se dice', 'que significa', 'en ingles',
-            'en español', 'al ingles', 'al español', 'en frances',
-            'en aleman', 'how to say', 'what does', 'mean in'
-        ],
-        
-        # Lyrics - EXPANDIDO
-        'lyrics': [
-            'letra', 'letras', 'cancion', 'song', 'lyrics', 'musica',
-            'artista', 'tema', 'busca letra', 'encuentra letra',
-            'banda', 'cantante', 'interpreta', 'canta', 'album'
-        ]
-    }
-    
+    # Minúsculas + sin acentos: las keywords se deduplicaron a su
+    # forma sin tilde
+    query_lower = query[:512].lower().translate(_STRIP_ACCENTS)
+
+    # Fast path: saludos y muletillas de 1-2 palabras no necesitan tools
+    tokens = query_lower.split()
+    if len(tokens) <= 2 and all(t in _CHAT_FILLERS for t in tokens):
+        return False
+
+    # Truncar a 512 chars acota el peor caso (los triggers aparecen al
+    # principio del mensaje) y mantiene pequeñas las claves del cache
+    return _scan_triggers(query_lower)
+
+
+@lru_cache(maxsize=4096)
+def _scan_triggers(query_lower: str) -> bool:
+    # Caso común primero: match exacto de token contra el set
+    if not _SINGLE_WORD_TRIGGERS.isdisjoint(query_lower.split()):
+        logger.debug("🎯 Detectado trigger por token exacto")
+        return True
+
     # Verificar si alguna categoría tiene coincidencias
-    for category, keywords in agent_triggers.items():
-        matches = sum(1 for keyword in keywords if keyword in query_lower)
-        if matches > 0:
-            logger.info(f"🎯 Detectado: {category} (matches: {matches})")
-            return True
-    
-    # Patrones adicionales (regex-like)
-    patterns = [
-        ('cuánto es', 'en'),  # "cuánto es X en Y"
-        ('cuanto vale', ''),
-        ('precio de', 'en'),
-        ('how much', 'in'),
-        ('what is', 'in'),
-    ]
-    
-    for pattern in patterns:
+    match = _AGENT_RE.search(query_lower)
+    if match:
+        logger.debug("🎯 Detectado: %s", match.lastgroup)
+        return True
+
+    for pattern in _EXTRA_PATTERNS:
         if all(p in query_lower for p in pattern if p):
-            logger.info(f"🎯 Detectado patrón: {pattern}")
+            logger.debug("🎯 Detectado patrón: %s", pattern)
             return True
-    
-    logger.info("💭 No se detectó necesidad de tools - usando Gemini directo")
+
+    logger.debug("💭 No se detectó necesidad de tools - usando Gemini directo")
     return False
 
 
-# Crear instancia global
-try:
-    intelligent_agent = IntelligentAgent()
-    logger.info("🎯 Agente inteligente listo para usar")
-except Exception as e:
-    logger.error(f"❌ No se pudo inicializar el agente: {e}")
-    intelligent_agent = None
+@lru_cache(maxsize=1)
+def get_agent():
+    """
+    Construye el agente global una sola vez, de forma perezosa:
+    importar este módulo (p. ej. solo por should_use_agent) ya no paga
+    la inicialización de ChatGoogleGenerativeAI ni del AgentExecutor
+    """
+    try:
+        agent = IntelligentAgent()
+        logger.info("🎯 Agente inteligente listo para usar")
+        return agent
+    except Exception as e:
+        logger.error("❌ No se pudo inicializar el agente: %s", e)
+        return None
+
+
+def __getattr__(name):
+    # PEP 562: `from utils.agent_handler import intelligent_agent` sigue
+    # funcionando, pero la instancia se crea recién al primer acceso
+    if name == 'intelligent_agent':
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
     # Testing mejorado
+    intelligent_agent = get_agent()
     if intelligent_agent:
         print("=" * 60)
         print("🧪 TESTING LANGCHAIN AGENT - VERSIÓN MEJORADA")
@@ -1,6 +1,6 @@
 import logging
-from datetime import datetime, timedelta
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
 from typing import Dict, List
 
 logger = logging.getLogger(__name__)
@@ -20,10 +20,20 @@ class ConversationManager:
             max_history: Número máximo de mensajes a recordar por usuario
             timeout_minutes: Minutos antes de limpiar conversación inactiva
         """
-        self.conversations: Dict[int, List[dict]] = defaultdict(list)
-        self.last_activity: Dict[int, datetime] = {}
+        # deque acotado: append O(1) y el mensaje más viejo se descarta solo,
+        # sin re-crear la lista en cada add_message
+        self.conversations: Dict[int, deque] = defaultdict(
+            lambda: deque(maxlen=max_history * 2)
+        )
+        # Timestamps en ns monotónicos: comparar ints es más barato que
+        # construir datetimes por mensaje y es inmune a saltos del reloj
+        self.last_activity: Dict[int, int] = {}
         self.max_history = max_history
-        self.timeout = timedelta(minutes=timeout_minutes)
+        self._timeout_ns = timeout_minutes * 60 * 10**9
+        # La limpieza corre como máximo una vez por minuto, no en cada
+        # add_message: el barrido era O(usuarios) por cada mensaje
+        self._cleanup_interval_ns = 60 * 10**9
+        self._next_cleanup = time.monotonic_ns() + self._cleanup_interval_ns
         
         logger.info(f"✅ ConversationManager inicializado (historial: {max_history}, timeout: {timeout_minutes}min)")
     
@@ -37,23 +47,21 @@ class ConversationManager:
             role: 'user' o 'assistant'
             content: Contenido del mensaje
         """
-        # Limpiar conversaciones antiguas
-        self._cleanup_old_conversations()
-        
-        # Agregar mensaje
+        now = time.monotonic_ns()
+
+        # Limpiar conversaciones antiguas (throttled)
+        if now >= self._next_cleanup:
+            self._cleanup_old_conversations()
+
+        # Agregar mensaje (sin timestamp por mensaje: nadie lo leía y
+        # costaba un datetime por escritura)
         self.conversations[user_id].append({
             'role': role,
-            'content': content,
-            'timestamp': datetime.now()
+            'content': content
         })
-        
-        # Limitar tamaño del historial
-        if len(self.conversations[user_id]) > self.max_history * 2:
-            # Mantener solo los últimos max_history pares (user + assistant)
-            self.conversations[user_id] = self.conversations[user_id][-(self.max_history * 2):]
-        
+
         # Actualizar última actividad
-        self.last_activity[user_id] = datetime.now()
+        self.last_activity[user_id] = now
         
         logger.debug(f"Mensaje agregado para usuario {user_id} (total: {len(self.conversations[user_id])})")
     
@@ -69,11 +77,13 @@ class ConversationManager:
         Returns:
             Lista de mensajes del historial
         """
-        history = self.conversations.get(user_id, [])
-        
+        history = self.conversations.get(user_id)
+
+        if not history:
+            return []
         if limit:
-            return history[-limit:]
-        return history
+            return list(history)[-limit:]
+        return list(history)
     
     
     def get_context_summary(self, user_id: int, last_n: int = 4) -> str:
@@ -126,20 +136,20 @@ class ConversationManager:
         """
         if user_id not in self.last_activity:
             return False
-        
-        time_since_last = datetime.now() - self.last_activity[user_id]
-        return time_since_last < self.timeout
+
+        return time.monotonic_ns() - self.last_activity[user_id] < self._timeout_ns
     
     
     def _cleanup_old_conversations(self):
         """
         Limpia conversaciones inactivas para liberar memoria
         """
-        current_time = datetime.now()
+        current_time = time.monotonic_ns()
+        self._next_cleanup = current_time + self._cleanup_interval_ns
         users_to_remove = []
-        
+
         for user_id, last_time in self.last_activity.items():
-            if current_time - last_time > self.timeout:
+            if current_time - last_time > self._timeout_ns:
                 users_to_remove.append(user_id)
         
         for user_id in users_to_remove:
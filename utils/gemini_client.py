@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import random
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage, AIMessage
 from typing import List, Dict
@@ -11,6 +13,56 @@ from config import GEMINI_API_KEY
 
 logger = logging.getLogger(__name__)
 
+# Prompt de sistema estático a nivel de módulo: el bloque grande queda
+# byte-idéntico entre llamadas (solo el nombre del usuario, al final,
+# varía), lo que permite que el cache de prefijos del proveedor acierte
+# y evita rearmar ~1 KB de string por request
+_SYSTEM_PROMPT = """
+Eres un asistente inteligente y versátil en un bot de Telegram.
+
+PERSONALIDAD:
+- Amigable pero profesional
+- Respuestas claras y estructuradas
+- Evitas ser repetitivo o predecible
+- Adaptas tu tono según el contexto
+- Usas emojis con moderación (1-2 por respuesta)
+- Respuestas concisas: máximo 3-4 párrafos
+
+ESTILO DE COMUNICACIÓN:
+- Si el usuario hace preguntas similares, ofreces perspectivas diferentes
+- Evitas frases clichés como "¡Claro!" o "¡Por supuesto!" al inicio
+- Vas directo al punto sin introducciones innecesarias
+- Usas formato Markdown cuando ayuda a la claridad
+- Si no sabes algo, lo admites honestamente
+
+CONTEXTO:
+- Plataforma: Telegram
+- Idioma: Español
+
+Mantén el contexto de la conversación pero no repitas información ya mencionada.
+"""
+
+
+# Respuestas de error amigables. A nivel de módulo para que los handlers
+# puedan distinguir un fallo de una respuesta real (p. ej. antes de
+# guardar algo en un pool o cache)
+ERROR_RESPONSES = (
+    "Disculpa, tuve un problema al procesar tu mensaje. ¿Podrías intentarlo de nuevo?",
+    "Lo siento, hubo un error temporal. Por favor intenta nuevamente.",
+    "Ups, algo no salió bien. ¿Podrías reformular tu pregunta?",
+)
+
+
+def _compress_history_content(content: str) -> str:
+    """
+    Acota los mensajes largos del historial (letras de canciones, tablas
+    de conversión) antes de reenviarlos como contexto: con los extremos
+    alcanza para mantener el hilo y se ahorran tokens de entrada
+    """
+    if len(content) <= 500:
+        return content
+    return content[:200] + " ...[recortado]... " + content[-200:]
+
 
 class GeminiClient:
     """
@@ -37,83 +89,151 @@ class GeminiClient:
             raise
     
     
+    def _build_messages(
+        self,
+        user_message: str,
+        conversation_history: List[dict] = None,
+        user_name: str = "Usuario"
+    ) -> list:
+        """
+        Arma la lista de mensajes (sistema + historial + mensaje actual)
+        compartida por las rutas síncrona y async
+        """
+        messages = []
+
+        # Sistema: personalidad del bot (prefijo estático) + el único dato
+        # dinámico (nombre del usuario) al final para no romper el prefijo
+        messages.append(SystemMessage(
+            content=_SYSTEM_PROMPT + f"Usuario actual: {user_name}\n"
+        ))
+
+        # Agregar historial de conversación (últimos mensajes)
+        if conversation_history:
+            # Limitar a los últimos 6 mensajes para no sobrecargar el contexto
+            recent_history = conversation_history[-6:] if len(conversation_history) > 6 else conversation_history
+
+            for msg in recent_history:
+                if msg['role'] == 'user':
+                    # Los mensajes del usuario son cortos: van completos
+                    messages.append(HumanMessage(content=msg['content']))
+                elif msg['role'] == 'assistant':
+                    messages.append(AIMessage(
+                        content=_compress_history_content(msg['content'])
+                    ))
+
+        # Agregar mensaje actual
+        messages.append(HumanMessage(content=user_message))
+        return messages
+
+
     def get_response_with_context(
-        self, 
-        user_message: str, 
+        self,
+        user_message: str,
         conversation_history: List[dict] = None,
         user_name: str = "Usuario"
     ) -> str:
         """
         Obtiene respuesta considerando el historial de conversación
-        
+
         Args:
             user_message: Mensaje actual del usuario
             conversation_history: Lista de mensajes previos [{'role': 'user'/'assistant', 'content': '...'}]
             user_name: Nombre del usuario para personalización
-        
+
         Returns:
             Respuesta generada por Gemini AI
         """
         try:
-            messages = []
-            
-            # Sistema: Personalidad del bot (mejorada)
-            system_prompt = f"""
-Eres un asistente inteligente y versátil en un bot de Telegram.
+            messages = self._build_messages(user_message, conversation_history, user_name)
 
-PERSONALIDAD:
-- Amigable pero profesional
-- Respuestas claras y estructuradas
-- Evitas ser repetitivo o predecible
-- Adaptas tu tono según el contexto
-- Usas emojis con moderación (1-2 por respuesta)
-- Respuestas concisas: máximo 3-4 párrafos
+            # Obtener respuesta
+            logger.info("📤 Enviando a Gemini con %d mensajes de contexto", len(messages))
+            response = self.llm.invoke(messages)
 
-ESTILO DE COMUNICACIÓN:
-- Si el usuario hace preguntas similares, ofreces perspectivas diferentes
-- Evitas frases clichés como "¡Claro!" o "¡Por supuesto!" al inicio
-- Vas directo al punto sin introducciones innecesarias
-- Usas formato Markdown cuando ayuda a la claridad
-- Si no sabes algo, lo admites honestamente
+            response_text = response.content.strip()
+            logger.info("📥 Respuesta: %.80s...", response_text)
 
-CONTEXTO:
-- Usuario: {user_name}
-- Plataforma: Telegram
-- Idioma: Español
+            return response_text
+
+        except Exception as e:
+            logger.error("❌ Error al obtener respuesta: %s", e)
+            return self._get_error_response()
+
+
+    async def aget_response_with_context(
+        self,
+        user_message: str,
+        conversation_history: List[dict] = None,
+        user_name: str = "Usuario"
+    ) -> str:
+        """
+        Variante async de get_response_with_context: usa ainvoke para que
+        el I/O al LLM se solape con el resto del event loop en lugar de
+        ocupar un worker thread
+        """
+        try:
+            messages = self._build_messages(user_message, conversation_history, user_name)
+
+            logger.info("📤 Enviando a Gemini con %d mensajes de contexto", len(messages))
+            response = await self.llm.ainvoke(messages)
 
-Mantén el contexto de la conversación pero no repitas información ya mencionada.
-"""
-            
-            messages.append(SystemMessage(content=system_prompt))
-            
-            # Agregar historial de conversación (últimos mensajes)
-            if conversation_history:
-                # Limitar a los últimos 6 mensajes para no sobrecargar el contexto
-                recent_history = conversation_history[-6:] if len(conversation_history) > 6 else conversation_history
-                
-                for msg in recent_history:
-                    if msg['role'] == 'user':
-                        messages.append(HumanMessage(content=msg['content']))
-                    elif msg['role'] == 'assistant':
-                        messages.append(AIMessage(content=msg['content']))
-            
-            # Agregar mensaje actual
-            messages.append(HumanMessage(content=user_message))
-            
-            # Obtener respuesta
-            logger.info(f"📤 Enviando a Gemini con {len(messages)} mensajes de contexto")
-            response = self.llm.invoke(messages)
-            
             response_text = response.content.strip()
-            logger.info(f"📥 Respuesta: {response_text[:80]}...")
-            
+            logger.info("📥 Respuesta: %.80s...", response_text)
+
             return response_text
-            
+
         except Exception as e:
-            logger.error(f"❌ Error al obtener respuesta: {e}")
+            logger.error("❌ Error al obtener respuesta: %s", e)
             return self._get_error_response()
-    
-    
+
+
+    async def aget_simple_response(self, prompt: str) -> str:
+        """
+        Variante async de get_simple_response (para comandos específicos)
+        """
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return response.content.strip()
+        except Exception as e:
+            logger.error("❌ Error en respuesta simple: %s", e)
+            return self._get_error_response()
+
+
+    async def astream_response(
+        self,
+        user_message: str,
+        conversation_history: List[dict] = None,
+        user_name: str = "Usuario"
+    ):
+        """
+        Variante streaming: cede fragmentos a medida que Gemini genera,
+        para que el handler muestre la respuesta parcial (la latencia
+        percibida pasa a ser el primer token, no el último)
+        """
+        messages = self._build_messages(user_message, conversation_history, user_name)
+
+        logger.info("📤 Streaming desde Gemini con %d mensajes de contexto", len(messages))
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
+
+
+    async def abatch_responses(self, messages_batch: List[list], max_concurrency: int = 8) -> List[str]:
+        """
+        Resuelve varias listas de mensajes en una sola llamada abatch,
+        dejando que LangChain solape los requests del lote (acotados por
+        max_concurrency para respetar los límites de Gemini)
+        """
+        try:
+            responses = await self.llm.abatch(
+                messages_batch, config={"max_concurrency": max_concurrency}
+            )
+            return [r.content.strip() for r in responses]
+        except Exception as e:
+            logger.error("❌ Error en lote abatch: %s", e)
+            return [self._get_error_response() for _ in messages_batch]
+
+
     def get_response(self, user_message: str, context: str = None) -> str:
         """
         Método simple para compatibilidad con código existente
@@ -137,14 +257,12 @@ Mantén el contexto de la conversación pero no repitas información ya menciona
         """
         Genera respuesta de error amigable
         """
-        error_responses = [
-            "Disculpa, tuve un problema al procesar tu mensaje. ¿Podrías intentarlo de nuevo?",
-            "Lo siento, hubo un error temporal. Por favor intenta nuevamente.",
-            "Ups, algo no salió bien. ¿Podrías reformular tu pregunta?",
-        ]
-        
-        import random
-        return random.choice(error_responses)
+        return random.choice(ERROR_RESPONSES)
+
+
+# Semáforo global: acota las llamadas concurrentes a Gemini para no agotar
+# sockets ni disparar 429 de Google bajo ráfagas
+gemini_semaphore = asyncio.Semaphore(20)
 
 
 # Crear instancia global
@@ -0,0 +1,16 @@
+"""
+Sesión HTTP compartida para las tools síncronas
+===============================================
+currency/translator/lyrics corren en worker threads (asyncio.to_thread)
+y usaban requests.get suelto: una conexión TCP+TLS nueva por llamada
+(~100 ms de handshake). Una Session única con keep-alive y pool
+reutiliza conexiones entre llamadas y entre tools.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
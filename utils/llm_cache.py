@@ -0,0 +1,67 @@
+"""
+Cache de respuestas LLM
+=======================
+Las mismas consultas se repiten entre usuarios ("convierte 100 dólares
+a euros", "traduce hello"); un hit evita el round-trip completo al LLM
+(cientos de ms a segundos) y el gasto de tokens asociado.
+
+Solo se cachean consultas sin contexto conversacional: una respuesta
+que dependa del historial de un usuario no puede compartirse.
+"""
+
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 1 hora: suficiente para absorber ráfagas de preguntas repetidas sin
+# servir respuestas demasiado viejas (las tasas de cambio, por ejemplo)
+CACHE_TTL_SECONDS = 3600
+CACHE_MAX_ENTRIES = 1024
+
+
+class LLMCache:
+    """
+    Cache en memoria con TTL, clave = sha256 de la consulta normalizada
+    """
+
+    def __init__(self, ttl: int = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        # clave -> (monotonic de guardado, respuesta)
+        self._cache = {}
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str) -> str:
+        normalized = ' '.join(query.strip().lower().split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, query: str):
+        """
+        Devuelve la respuesta cacheada o None si no hay hit vigente
+        """
+        entry = self._cache.get(self._key(query))
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            self.hits += 1
+            logger.info("📦 Cache LLM hit (%d hits / %d misses)", self.hits, self.misses)
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, query: str, response: str):
+        """
+        Guarda una respuesta exitosa (los errores no se cachean)
+        """
+        if not response:
+            return
+        if len(self._cache) >= self.max_entries:
+            # Descartar la entrada más vieja para acotar memoria
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[self._key(query)] = (time.monotonic(), response)
+
+
+# Caches globales compartidos entre handlers
+agent_cache = LLMCache()
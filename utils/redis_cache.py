@@ -0,0 +1,81 @@
+"""
+Cache global de traducciones respaldado en Redis
+================================================
+Las frases comunes ("hola", "gracias", "how are you") se repiten entre
+usuarios; un GET a Redis (~1 ms) evita el round-trip de 200-800 ms a la
+API de traducción.
+
+Redis es opcional: si la librería no está instalada o no hay REDIS_URL,
+los helpers degradan a no-ops y el bot sigue funcionando igual.
+
+Se usa el cliente asyncio del mismo paquete: los helpers se llaman desde
+handlers async y un GET síncrono bloquearía el event loop entero hasta
+socket_timeout si Redis está lento o caído.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# 14 días de TTL: las traducciones no caducan de verdad, pero así el cache
+# no crece sin límite
+TRANSLATION_TTL = 86400 * 14
+
+_client = None
+if redis is not None:
+    _redis_url = os.getenv('REDIS_URL')
+    if _redis_url:
+        try:
+            _client = redis.Redis.from_url(
+                _redis_url, socket_timeout=1, decode_responses=True
+            )
+            logger.info("✅ Cache Redis de traducciones conectado")
+        except Exception as e:
+            logger.warning("⚠️ Redis no disponible, cache desactivado: %s", e)
+            _client = None
+
+
+def _key(texto: str, target_lang: str) -> str:
+    """
+    Genera la clave de cache: translate:v1:{md5(texto)}:{idioma destino}
+    """
+    digest = hashlib.md5(texto.encode('utf-8')).hexdigest()
+    return f"translate:v1:{digest}:{target_lang}"
+
+
+async def get_cached_translation(texto: str, target_lang: str):
+    """
+    Devuelve el resultado cacheado (dict) o None si no hay hit
+    """
+    if _client is None:
+        return None
+    try:
+        raw = await _client.get(_key(texto, target_lang))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning("⚠️ Error leyendo cache Redis: %s", e)
+        return None
+
+
+async def cache_translation(texto: str, target_lang: str, result: dict):
+    """
+    Guarda un resultado de traducción exitoso (los errores no se cachean)
+    """
+    if _client is None or 'error' in result:
+        return
+    try:
+        await _client.setex(
+            _key(texto, target_lang),
+            TRANSLATION_TTL,
+            json.dumps(result, ensure_ascii=False)
+        )
+    except Exception as e:
+        logger.warning("⚠️ Error escribiendo cache Redis: %s", e)
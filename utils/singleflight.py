@@ -0,0 +1,48 @@
+"""
+Coalescer de peticiones idénticas ("singleflight")
+===================================================
+Si 50 usuarios piden "100 USD a EUR" en el mismo segundo, solo la
+primera petición viaja a la API externa; las demás esperan y reutilizan
+su resultado. Reduce el QPS upstream por el factor de duplicación y
+evita 429 bajo ráfagas.
+"""
+
+import asyncio
+
+_inflight = {}
+
+
+async def singleflight(key: str, coro_factory):
+    """
+    Ejecuta `coro_factory()` salvo que ya haya una llamada en vuelo con
+    la misma clave, en cuyo caso espera y comparte su resultado
+
+    Args:
+        key: Clave que identifica la petición (ej. "cv:100:USD:EUR")
+        coro_factory: Callable sin argumentos que devuelve la corrutina
+
+    Returns:
+        El resultado de la llamada (propia o compartida)
+    """
+    fut = _inflight.get(key)
+    if fut is not None:
+        return await fut
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        result = await coro_factory()
+        fut.set_result(result)
+        return result
+    except Exception as e:
+        fut.set_exception(e)
+        # Marcar la excepción como observada por si nadie más espera
+        fut.exception()
+        raise
+    finally:
+        # Si el líder fue cancelado (CancelledError no pasa por el except
+        # de arriba), el futuro quedaría pendiente y los seguidores
+        # esperarían para siempre: cancelarlo los despierta
+        if not fut.done():
+            fut.cancel()
+        _inflight.pop(key, None)
@@ -1,10 +1,17 @@
 import logging
+import time
 import requests
 from typing import Optional
 from langchain.tools import Tool
 
+from utils.http_session import session
+
 logger = logging.getLogger(__name__)
 
+# Las tasas cambian lento: 6 horas de cache evitan la gran mayoría de los
+# round-trips a la API (los pares populares se repiten entre usuarios)
+RATE_TTL_SECONDS = 21600
+
 
 class CurrencyConverter:
     """
@@ -23,9 +30,54 @@ class CurrencyConverter:
             'BRL': 'R$', 'INR': '₹', 'KRW': '₩', 'CHF': 'Fr'
         }
         
+        # moneda origen -> (monotonic de guardado, tabla completa de tasas)
+        self._rate_cache = {}
+
         logger.info("✅ CurrencyConverter inicializado")
-    
-    
+
+
+    def _get_rates(self, from_currency: str) -> dict:
+        """
+        Obtiene (y cachea) la tabla de tasas para una moneda origen.
+        Si la API falla y hay tasas viejas, se usan como fallback.
+        """
+        cached = self._rate_cache.get(from_currency)
+        now = time.monotonic()
+
+        if cached and now - cached[0] < RATE_TTL_SECONDS:
+            return cached[1]
+
+        try:
+            response = session.get(
+                f"{self.base_url}/{from_currency}",
+                timeout=10
+            )
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException:
+            if cached:
+                logger.warning("⚠️ API de tasas caída; usando tasas cacheadas (stale) para %s", from_currency)
+                return cached[1]
+            raise
+
+        self._rate_cache[from_currency] = (now, data)
+        return data
+
+
+    def valid_codes(self) -> frozenset:
+        """
+        Conjunto de códigos de moneda soportados, derivado de la tabla de
+        tasas de USD (misma cache de 6 h). Permite rechazar códigos
+        inválidos localmente sin gastar un request a la API.
+        """
+        try:
+            return frozenset(self._get_rates('USD')['rates'])
+        except Exception as e:
+            logger.warning("⚠️ No se pudo obtener la lista de monedas: %s", e)
+            return frozenset()
+
+
+
     def convert(self, amount: float, from_currency: str, to_currency: str) -> dict:
         """
         Convierte una cantidad de una moneda a otra
@@ -44,15 +96,9 @@ class CurrencyConverter:
             to_currency = to_currency.upper().strip()
             
             logger.info(f"💱 Convirtiendo {amount} {from_currency} → {to_currency}")
-            
-            # Obtener tasas de cambio
-            response = requests.get(
-                f"{self.base_url}/{from_currency}",
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+
+            # Obtener tasas de cambio (cacheadas; la multiplicación es local)
+            data = self._get_rates(from_currency)
             
             # Verificar que la moneda destino existe
             if to_currency not in data['rates']:
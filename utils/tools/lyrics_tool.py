@@ -1,10 +1,23 @@
+import hashlib
+import json
 import logging
+import os
+import unicodedata
 import requests
 from typing import Optional
 from langchain.tools import Tool
 
+from utils.http_session import session
+
 logger = logging.getLogger(__name__)
 
+# Cache persistente de letras: las letras no cambian, así que un hit
+# evita el scrape HTTP completo (1-3 s) en canciones repetidas
+_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'cache', 'lyrics'
+)
+
 
 class LyricsFinder:
     """
@@ -17,8 +30,36 @@ class LyricsFinder:
         self.base_url = "https://api.lyrics.ovh/v1"
         
         logger.info("✅ LyricsFinder inicializado")
-    
-    
+
+
+    def _cache_key(self, artist: str, song: str) -> str:
+        """
+        Clave normalizada: minúsculas y sin diacríticos, para que
+        "Tití" y "Titi" compartan entrada
+        """
+        raw = f"{artist}|{song}".strip().lower()
+        raw = unicodedata.normalize('NFKD', raw)
+        raw = ''.join(c for c in raw if not unicodedata.combining(c))
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+    def _cache_read(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(_CACHE_DIR, key + '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def _cache_write(self, key: str, result: dict):
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            with open(os.path.join(_CACHE_DIR, key + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo guardar letra en cache: %s", e)
+
+
     def search_lyrics(self, artist: str, song: str) -> dict:
         """
         Busca la letra de una canción
@@ -37,12 +78,19 @@ class LyricsFinder:
             
             if not artist or not song:
                 return {'error': 'Debe proporcionar artista y canción'}
-            
+
+            # Las letras no caducan: un hit salta el request por completo
+            cache_key = self._cache_key(artist, song)
+            cached = self._cache_read(cache_key)
+            if cached is not None:
+                logger.info("📦 Letra desde cache: '%s' de %s", song, artist)
+                return cached
+
             logger.info(f"🎵 Buscando: '{song}' de {artist}")
-            
+
             # Hacer request a la API
             url = f"{self.base_url}/{artist}/{song}"
-            response = requests.get(url, timeout=15)
+            response = session.get(url, timeout=15)
             
             if response.status_code == 404:
                 return {
@@ -65,6 +113,8 @@ class LyricsFinder:
                 }
                 
                 logger.info(f"✅ Letra encontrada: {result['lines']} líneas")
+                # Solo se cachean éxitos (los errores se reintentan)
+                self._cache_write(cache_key, result)
                 return result
             else:
                 return {'error': 'La letra no está disponible en este momento'}
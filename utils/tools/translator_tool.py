@@ -3,6 +3,8 @@ import requests
 from typing import Optional
 from langchain.tools import Tool
 
+from utils.http_session import session
+
 logger = logging.getLogger(__name__)
 
 
@@ -89,7 +91,7 @@ class Translator:
             }
             
             # Hacer request a la API
-            response = requests.get(
+            response = session.get(
                 self.base_url,
                 params=params,
                 timeout=15
@@ -234,7 +236,7 @@ class Translator:
         last_err = None
         for url in endpoints:
             try:
-                resp = requests.post(url, json=payload, headers=headers, timeout=15)
+                resp = session.post(url, json=payload, headers=headers, timeout=15)
                 resp.raise_for_status()
                 try:
                     j = resp.json()
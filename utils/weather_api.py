@@ -1,29 +1,49 @@
 import logging
-import requests
+import time
+import httpx
 from config import WEATHER_API_KEY
 
 logger = logging.getLogger(__name__)
 
+# Cache TTL en memoria: el clima de una ciudad apenas cambia minuto a minuto,
+# así que las consultas repetidas se responden sin tocar la red
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 1024
+
 class WeatherAPI:
     """
     Cliente para obtener información del clima usando OpenWeatherMap API
     """
-    
+
     def __init__(self):
         self.api_key = WEATHER_API_KEY
         self.base_url = "https://api.openweathermap.org/data/2.5"
-    
-    
-    def get_current_weather(self, city: str) -> dict:
+        # Un solo cliente async con keep-alive: las consultas no bloquean el
+        # event loop y reutilizan la conexión TCP/TLS entre llamadas
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=10
+        )
+        # ciudad normalizada -> (monotonic de guardado, datos)
+        self._cache = {}
+
+
+    async def get_current_weather(self, city: str) -> dict:
         """
         Obtiene el clima actual de una ciudad usando OpenWeatherMap
-        
+
         Args:
             city: Nombre de la ciudad
-            
+
         Returns:
             Diccionario con información del clima o None si hay error
         """
+        cache_key = city.strip().casefold()
+        hit = self._cache.get(cache_key)
+        if hit and time.monotonic() - hit[0] < CACHE_TTL_SECONDS:
+            logger.info(f"Clima servido desde cache para: {city}")
+            return hit[1]
+
         try:
             # Construir URL de la API de OpenWeatherMap
             url = f"{self.base_url}/weather"
@@ -33,15 +53,15 @@ class WeatherAPI:
                 "units": "metric",  # Celsius
                 "lang": "es"  # Respuestas en español
             }
-            
+
             logger.info(f"Consultando clima para: {city}")
-            
-            # Hacer petición a la API
-            response = requests.get(url, params=params, timeout=10)
+
+            # Hacer petición a la API (no bloquea el loop)
+            response = await self._client.get(url, params=params)
             response.raise_for_status()
-            
+
             data = response.json()
-            
+
             # Extraer información relevante de OpenWeatherMap
             weather_info = {
                 "ciudad": data["name"],
@@ -59,34 +79,40 @@ class WeatherAPI:
                 "temp_max": round(data["main"]["temp_max"], 1),
                 "nubosidad": data["clouds"]["all"]
             }
-            
+
             logger.info(f"Clima obtenido: {weather_info['ciudad']}, {weather_info['temperatura']}°C")
+
+            # Guardar en cache (solo respuestas exitosas); cota simple de tamaño
+            if len(self._cache) >= CACHE_MAX_ENTRIES:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[cache_key] = (time.monotonic(), weather_info)
+
             return weather_info
-            
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 404:
+
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
                 logger.warning(f"Ciudad no encontrada: {city}")
                 return {"error": "Ciudad no encontrada"}
-            elif response.status_code == 401:
+            elif e.response.status_code == 401:
                 logger.error("API Key inválida")
                 return {"error": "Error de autenticación - Verifica tu API Key"}
             else:
                 logger.error(f"Error HTTP: {e}")
                 return {"error": "Error al consultar la API"}
-                
-        except requests.exceptions.Timeout:
+
+        except httpx.TimeoutException:
             logger.error("Timeout al consultar OpenWeatherMap")
             return {"error": "Tiempo de espera agotado"}
-            
-        except requests.exceptions.RequestException as e:
+
+        except httpx.RequestError as e:
             logger.error(f"Error de conexión: {e}")
             return {"error": "Error de conexión"}
-            
+
         except Exception as e:
             logger.error(f"Error inesperado: {e}")
             return {"error": "Error inesperado"}
-    
-    
+
+
     def _get_wind_direction(self, degrees: int) -> str:
         """
         Convierte grados a dirección cardinal
@@ -94,15 +120,15 @@ class WeatherAPI:
         directions = ['N', 'NE', 'E', 'SE', 'S', 'SO', 'O', 'NO']
         index = round(degrees / 45) % 8
         return directions[index]
-    
-    
+
+
     def format_weather_message(self, weather_data: dict) -> str:
         """
         Formatea la información del clima en un mensaje legible
-        
+
         Args:
             weather_data: Diccionario con datos del clima
-            
+
         Returns:
             Mensaje formateado
         """
@@ -111,7 +137,7 @@ class WeatherAPI:
                 return "No pude encontrar esa ciudad. Verifica el nombre e intenta de nuevo."
             else:
                 return f"{weather_data['error']}. Por favor intenta más tarde."
-        
+
         # Determinar emoji según la condición
         condicion_lower = weather_data["condicion"].lower()
         if "despejado" in condicion_lower or "claro" in condicion_lower:
@@ -128,7 +154,7 @@ class WeatherAPI:
             emoji = "🌫️"
         else:
             emoji = "🌤️"
-        
+
         message = f"""
 {emoji} **CLIMA EN {weather_data['ciudad'].upper()}, {weather_data['pais']}**
 
@@ -145,9 +171,9 @@ class WeatherAPI:
 
 _Powered by OpenWeatherMap_
         """
-        
+
         return message.strip()
 
 
 # Crear instancia global
-weather_api = WeatherAPI()
\ No newline at end of file
+weather_api = WeatherAPI()